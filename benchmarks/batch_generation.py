@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Posts per second of Imposter.generate_text in a loop against generate_batch.
+
+    usage: python benchmarks/batch_generation.py [corpus.txt] [n_posts]
+
+Without a corpus argument a newyork_mis sized corpus is synthesized, see
+cache_memory.py. The bot directory created for the run is removed afterwards.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'imposter'))
+
+from cache_memory import synthesize_corpus
+from markov import Imposter
+
+
+def main():
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    if len(sys.argv) > 1:
+        corpus = sys.argv[1]
+    else:
+        corpus = os.path.join(tempfile.mkdtemp(), 'bench_batch.txt')
+        synthesize_corpus(corpus)
+
+    for compact in (False, True):
+        bot = Imposter(corpus, compact=compact)
+        try:
+            bot.generate_batch(10)      # builds batch arrays outside the timing
+            start = time.perf_counter()
+            for _ in range(n):
+                bot.generate_text(sentence_start=True)
+            loop = n / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            bot.generate_batch(n, sentence_start=True)
+            batch = n / (time.perf_counter() - start)
+            print('{:<8} loop={:>8.0f} posts/s  batch={:>8.0f} posts/s  speedup={:.1f}x'.format(
+                'compact' if compact else 'cache', loop, batch, batch / loop))
+        finally:
+            shutil.rmtree(bot.bot_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Compares memory held by the legacy Imposter.cache dict and a TransitionTable
+    built from the same corpus.
+
+    usage: python benchmarks/cache_memory.py [corpus.txt]
+
+Without a corpus argument, a newyork_mis sized corpus is synthesized by random
+walks over imposter/bots/newyork_mis/cache.json.
+"""
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from ast import literal_eval
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'imposter'))
+
+from config import *
+from model import TransitionTable
+
+
+def synthesize_corpus(path, n_words=300000):
+    with open(os.path.join(BOTS_DIR, 'newyork_mis', 'cache.json')) as f:
+        cache = {literal_eval(k): v for k, v in json.load(f).items()}
+    keys = list(cache)
+    words = []
+    state = random.choice(keys)
+    while len(words) < n_words:
+        if state not in cache:
+            state = random.choice(keys)
+            words.extend(state)
+        next_word = random.choice(cache[state])
+        words.append(next_word)
+        state = (state[1], next_word)
+    with open(path, 'w') as f:
+        for i in range(0, len(words), 20):
+            f.write(' '.join(words[i:i + 20]) + '\n')
+
+
+def windows(path):
+    """Same triplets as Imposter.raw_states"""
+    with open(path) as f:
+        words = f.read().split()
+    return zip(words, words[1:], words[2:])
+
+
+def build_legacy(path):
+    cache = {}
+    for state in windows(path):
+        key = (state[0], state[1])
+        if key in cache:
+            cache[key].append(state[2])
+        else:
+            cache[key] = [state[2]]
+    return cache
+
+
+def build_compact(path):
+    return TransitionTable.from_windows(windows(path))
+
+
+def measure(build, path):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = build(path)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return model, retained, peak, elapsed
+
+
+def main():
+    if len(sys.argv) > 1:
+        corpus = sys.argv[1]
+    else:
+        corpus = os.path.join(tempfile.mkdtemp(), 'newyork_mis.txt')
+        synthesize_corpus(corpus)
+    print('corpus: {} ({:.1f} MB)'.format(corpus, os.path.getsize(corpus) / 1e6))
+
+    results = {}
+    for name, build in (('legacy cache', build_legacy), ('TransitionTable', build_compact)):
+        model, retained, peak, elapsed = measure(build, corpus)
+        results[name] = retained
+        print('{:<16} states={:<8} retained={:>7.1f} MB  peak={:>7.1f} MB  build={:.2f}s'.format(
+            name, len(model), retained / 1e6, peak / 1e6, elapsed))
+        del model
+    print('reduction: {:.1f}x'.format(results['legacy cache'] / results['TransitionTable']))
+
+
+if __name__ == '__main__':
+    main()
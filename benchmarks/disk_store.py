@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Compares next word latency of the disk backed SQLiteStore with in-memory models.
+
+    usage: python benchmarks/disk_store.py [--size 100] [--modes cache,compact,disk]
+
+A bot is built per mode from a synthetic corpus of --size MB (see suite.py),
+then reopened in a fresh process as a restarted bot would be. next_word is
+timed for LOOKUPS states drawn with select_seed, first cold, right after the
+reopen, then warm, repeating the same states. p50 and p99 latencies, posts per
+second from generate_text and the peak RSS of the reopened process are
+printed.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'imposter'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from config import *
+from suite import peak_rss_mb, synthetic_corpus
+
+LOOKUPS = 20000
+GENERATE_CALLS = 500
+
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def lookups(bot, states):
+    """Returns latency of next_word for each state, in microseconds"""
+    latencies = []
+    for state in states:
+        start = time.perf_counter()
+        bot.next_word(state)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def open_bot(corpus, mode):
+    from markov import Imposter
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        return Imposter(corpus, compact=mode == 'compact', disk=mode == 'disk')
+
+
+def build(corpus, mode):
+    open_bot(corpus, mode)
+
+
+def run_case(corpus, mode):
+    """Reopens the bot built for mode and times lookups, in a fresh worker process"""
+    random.seed(0)
+    start = time.perf_counter()
+    bot = open_bot(corpus, mode)
+    load = time.perf_counter() - start
+    states = [bot.select_seed() for _ in range(LOOKUPS)]
+    cold = lookups(bot, states)
+    warm = lookups(bot, states)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for _ in range(GENERATE_CALLS):
+            bot.generate_text()
+    generate = time.perf_counter() - start
+    return {
+        'mode': mode,
+        'load_s': load,
+        'cold_p50_us': percentile(cold, 50),
+        'cold_p99_us': percentile(cold, 99),
+        'warm_p50_us': percentile(warm, 50),
+        'warm_p99_us': percentile(warm, 99),
+        'generate_posts_s': GENERATE_CALLS / generate,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=100, help='corpus size in MB')
+    parser.add_argument('--modes', default='cache,compact,disk')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        synthetic = os.path.join(workdir, 'corpus.txt')
+        synthetic_corpus(synthetic, args.size)
+        for mode in args.modes.split(','):
+            name = 'bench_disk_{}mb_{}'.format(args.size, mode)
+            corpus = os.path.join(workdir, name + '.txt')
+            os.link(synthetic, corpus)
+            try:
+                with Pool(1) as pool:   # builds and saves the model
+                    pool.apply(build, (corpus, mode))
+                with Pool(1) as pool:
+                    result = pool.apply(run_case, (corpus, mode))
+                print('{mode:<8} load {load_s:7.2f}s  next_word cold p50 {cold_p50_us:6.1f}us '
+                      'p99 {cold_p99_us:7.1f}us  warm p50 {warm_p50_us:6.1f}us p99 {warm_p99_us:7.1f}us  '
+                      'generate {generate_posts_s:6.0f} posts/s  peak rss {peak_rss_mb:6.0f} MB'
+                      .format(**result))
+            finally:
+                shutil.rmtree(os.path.join(BOTS_DIR, name), ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
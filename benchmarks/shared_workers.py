@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compares generation workers that attach to a shared memory model with workers
+    that load their own cache.
+
+    usage: python benchmarks/shared_workers.py [--size 20] [--workers 1,2,4,8]
+
+A bot is built from a synthetic corpus of --size MB (see suite.py). For each
+worker count, that many processes are started; each opens the bot, either with
+Imposter(shared=...) on a model published once with Imposter.publish, or as a
+legacy cache bot loading cache.json, then generates GENERATE_CALLS posts.
+Reported are the mean time for a worker to open the bot and the memory private
+to the workers (USS, from /proc/<pid>/smaps_rollup), summed over workers.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'imposter'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from config import *
+from suite import synthetic_corpus
+
+GENERATE_CALLS = 200
+
+
+def private_mb():
+    with open('/proc/self/smaps_rollup') as f:
+        fields = dict(line.split(':') for line in f if line.startswith('Private'))
+    return sum(int(value.split()[0]) for value in fields.values()) / 1024
+
+
+def worker(corpus, shared, results):
+    from markov import Imposter
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        bot = Imposter(corpus, shared=shared)
+        opened = time.perf_counter() - start
+        for _ in range(GENERATE_CALLS):
+            bot.generate_text()
+    results.put((opened, private_mb()))
+
+
+def run(corpus, shared, n):
+    context = get_context('spawn')     # fresh interpreters, not copies of this process
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(corpus, shared, results)) for _ in range(n)]
+    for w in workers:
+        w.start()
+    measured = [results.get() for _ in workers]
+    for w in workers:
+        w.join()
+    return sum(t for t, _ in measured) / n, sum(m for _, m in measured)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=20, help='corpus size in MB')
+    parser.add_argument('--workers', default='1,2,4,8')
+    args = parser.parse_args()
+
+    from markov import Imposter
+    workdir = tempfile.mkdtemp()
+    corpus = os.path.join(workdir, 'bench_shared.txt')
+    try:
+        synthetic_corpus(corpus, args.size)
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            Imposter(corpus)                            # cache.json for the legacy workers
+            bot = Imposter(corpus, compact=True)
+        with bot.publish() as published:
+            for n in [int(n) for n in args.workers.split(',')]:
+                for mode, shared in (('cache', None), ('shared', published.name)):
+                    opened, private = run(corpus, shared, n)
+                    print('{:>3} workers {:<7} open {:8.3f}s  private memory {:8.1f} MB'.format(
+                        n, mode, opened, private))
+    finally:
+        shutil.rmtree(os.path.join(BOTS_DIR, 'bench_shared'), ignore_errors=True)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
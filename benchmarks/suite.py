@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Benchmarks building, saving, loading, seeding and generating on synthetic corpora.
+
+    usage: python benchmarks/suite.py [--sizes 1,10,100,1000] [--modes cache,compact]
+                                      [--output results.json] [--compare old.json]
+
+For each corpus size (in MB) and model mode, a fresh process builds a bot
+from a synthetic corpus and times Imposter._build_cache_from_corpus,
+_save_cache, load_saved_cache (load_model for compact bots), select_seed and
+generate_text. Throughput and the process's peak RSS are reported and saved
+as JSON with the current commit, so runs from two commits can be compared
+with --compare. The legacy cache of a 1000 MB corpus needs tens of GB of
+memory, so that size is best run with --modes compact.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'imposter'))
+
+from config import *
+
+VOCAB_SIZE = 50000
+SEED_CALLS = 10000
+GENERATE_CALLS = 500
+
+
+def synthetic_corpus(path, size_mb, seed=0):
+    """Writes about size_mb MB of Zipf distributed words with sentence ends to path"""
+    rng = random.Random(seed)
+    vocab = ['w{}'.format(i) for i in range(VOCAB_SIZE)]
+    vocab += [w + '.' for w in vocab[:VOCAB_SIZE // 10]]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    rng.shuffle(weights)
+    target = size_mb << 20
+    written = 0
+    with open(path, 'w') as f:
+        while written < target:
+            line = ' '.join(rng.choices(vocab, weights, k=20000)) + '\n'
+            f.write(line)
+            written += len(line)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def run_case(corpus, size_mb, compact):
+    """Runs every timing for one corpus and mode, in a fresh worker process"""
+    from corpora import remove_bot
+    from markov import Imposter
+    from metrics import Metrics
+    from modelfile import load_model
+
+    mode = 'compact' if compact else 'cache'
+    name = 'bench_{}mb_{}'.format(size_mb, mode)
+    bot_corpus = os.path.join(os.path.dirname(corpus), name + '.txt')
+    os.link(corpus, bot_corpus)
+    sha1 = None     # of the stored copy of the corpus, which must go with the bot
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            bot = Imposter(bot_corpus, compact=compact)   # first build warms the file cache
+            sha1 = bot.source['sha1']
+            bot.cache, bot.model = {}, None
+            bot.metrics = Metrics()
+            bot._build_cache_from_corpus()
+            build = bot.metrics.total('build')     # less the save it ends with
+            save, _ = timed(bot._save_cache)
+            if compact:
+                load, _ = timed(load_model, bot.model_file)
+            else:
+                bot.cache = {}
+                load, _ = timed(bot.load_saved_cache)
+            saved_bytes = os.path.getsize(bot.model_file if compact else bot.cache_file)
+
+            bot.select_seed()
+            seed, _ = timed(lambda: [bot.select_seed() for _ in range(SEED_CALLS)])
+            generate, _ = timed(lambda: [bot.generate_text() for _ in range(GENERATE_CALLS)])
+        return {
+            'size_mb': size_mb,
+            'mode': mode,
+            'states': bot.state_count,
+            'build_s': build,
+            'build_mb_s': size_mb / build,
+            'save_s': save,
+            'saved_mb': saved_bytes / 1e6,
+            'load_s': load,
+            'load_mb_s': saved_bytes / 1e6 / load,
+            'select_seed_us': seed / SEED_CALLS * 1e6,
+            'generate_posts_s': GENERATE_CALLS / generate,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    finally:
+        remove_bot(os.path.join(BOTS_DIR, name))
+        os.remove(bot_corpus)
+        if sha1 is not None:
+            stored = [path for path in os.listdir(CORPUS_STORE_DIR) if path.startswith(sha1)]
+            assert not stored, 'stored corpus left behind: {}'.format(stored)
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    with open(path) as f:
+        old = {(r['size_mb'], r['mode']): r for r in json.load(f)['results']}
+    print('\nrelative to {} (>1 is faster, or less memory for peak_rss_mb)'.format(path))
+    for r in results:
+        before = old.get((r['size_mb'], r['mode']))
+        if not before:
+            continue
+        ratios = []
+        for key in ('build_s', 'save_s', 'load_s', 'select_seed_us', 'peak_rss_mb'):
+            ratios.append('{}={:.2f}'.format(key, before[key] / r[key]))
+        ratios.append('generate_posts_s={:.2f}'.format(r['generate_posts_s'] / before['generate_posts_s']))
+        print('{:>6} MB {:<8} {}'.format(r['size_mb'], r['mode'], '  '.join(ratios)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='1,10,100', help='corpus sizes in MB, up to 1000')
+    parser.add_argument('--modes', default='cache,compact')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    results = []
+    try:
+        for size_mb in [int(s) for s in args.sizes.split(',')]:
+            corpus = os.path.join(workdir, 'corpus_{}mb.txt'.format(size_mb))
+            synthetic_corpus(corpus, size_mb)
+            for mode in args.modes.split(','):
+                with Pool(1) as pool:   # fresh process, so peak RSS is per case
+                    result = pool.apply(run_case, (corpus, size_mb, mode == 'compact'))
+                results.append(result)
+                print('{size_mb:>6} MB {mode:<8} build {build_s:8.2f}s ({build_mb_s:6.2f} MB/s)  '
+                      'save {save_s:7.2f}s  load {load_s:7.3f}s  seed {select_seed_us:7.1f}us  '
+                      'generate {generate_posts_s:8.0f} posts/s  peak rss {peak_rss_mb:8.0f} MB'
+                      .format(**result))
+            os.remove(corpus)
+    finally:
+        shutil.rmtree(workdir)
+
+    with open(args.output, 'w') as f:
+        json.dump({'commit': commit(), 'python': platform.python_version(),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, f, indent=2)
+    print('saved {}'.format(args.output))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
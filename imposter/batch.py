@@ -0,0 +1,102 @@
+"""Generates many posts at once by advancing chains in lockstep with numpy.
+
+Each step draws the next word of every active chain with one vectorized
+search: a chain's target weight is offset into its row of the table's
+running count totals, so a single searchsorted over the whole cumulative
+array lands inside the right row for all chains. The following states are
+packed and found in the sorted keys with another searchsorted.
+"""
+import numpy as np
+
+ENDINGS = '.?!'
+
+
+class BatchGenerator(object):
+    """Vectorized generation over a TransitionTable's arrays, which are shared, not copied.
+        States changed by update() are seen once the table is frozen"""
+
+    def __init__(self, table):
+        if isinstance(table.keys, list):
+            raise ValueError('batch generation needs state keys packed in 64 bits')
+        self.table = table
+        self.order = table.order
+        self.bits = table.bits
+        self.keys = np.frombuffer(table.keys, dtype=np.uint64)
+        self.offsets = np.frombuffer(table.offsets, dtype=np.uint64).astype(np.int64)
+        self.next_ids = np.frombuffer(table.next_ids, dtype=np.uint32)
+        self.cumulative = np.frombuffer(table.sampler.cumulative, dtype=np.uint64)
+        vocab = table.vocab
+        self.ends = np.array([vocab[i][-1] in ENDINGS for i in range(len(vocab))], dtype=bool)
+
+    def sample_rows(self, n):
+        """Draws n rows, each as often as its state occurs, by searching the running totals"""
+        targets = (np.random.random_sample(n) * float(self.cumulative[-1])).astype(np.uint64)
+        transitions = np.searchsorted(self.cumulative, targets, side='right')
+        return np.searchsorted(self.offsets, transitions, side='right') - 1
+
+    def sample_starts(self, n):
+        """Draws n rows of sentence starting states, each as often as it starts a sentence"""
+        rows, totals = self.table.sentence_starts()
+        totals = np.frombuffer(totals, dtype=np.uint64)
+        targets = (np.random.random_sample(n) * float(totals[-1])).astype(np.uint64)
+        picks = np.searchsorted(totals, targets, side='right')
+        return np.frombuffer(rows, dtype=np.uint32).astype(np.int64)[picks]
+
+    def state_ids(self, rows):
+        """Returns (len(rows), order) array of the word ids of each row's state"""
+        keys = self.keys[rows]
+        mask = np.uint64((1 << self.bits) - 1)
+        ids = np.empty((len(rows), self.order), dtype=np.uint64)
+        for j in range(self.order):
+            shift = np.uint64(self.bits * (self.order - 1 - j))
+            ids[:, j] = (keys >> shift) & mask
+        return ids
+
+    def find_rows(self, states):
+        """Returns row of each state in a (n, order) id array, -1 where not in table"""
+        keys = np.zeros(len(states), dtype=np.uint64)
+        for j in range(self.order):
+            keys = (keys << np.uint64(self.bits)) | states[:, j]
+        rows = np.searchsorted(self.keys, keys)
+        found = rows < len(self.keys)
+        found[found] = self.keys[rows[found]] == keys[found]
+        return np.where(found, rows, -1)
+
+    def advance(self, rows):
+        """Returns one weighted random next word id for each row"""
+        lo, hi = self.offsets[rows], self.offsets[rows + 1]
+        base = np.where(lo > 0, self.cumulative[np.maximum(lo - 1, 0)], np.uint64(0))
+        total = self.cumulative[hi - 1] - base
+        target = base + (np.random.random_sample(len(rows)) * total).astype(np.uint64)
+        return self.next_ids[np.searchsorted(self.cumulative, target, side='right')]
+
+    def generate(self, seed_rows, size=139, min_size=20):
+        """Returns list of word id lists, one chain per seed row. Chains stop like
+            Imposter.generate_text: on a sentence end after min_size words, at size
+            words, or at a state with no successors"""
+        n = len(seed_rows)
+        size = min(size, 140)
+        tokens = np.zeros((n, size), dtype=np.uint32)
+        lengths = np.full(n, size, dtype=np.int64)
+        states = self.state_ids(seed_rows)
+        rows = np.asarray(seed_rows, dtype=np.int64)
+        active = np.ones(n, dtype=bool)
+        for i in range(size):
+            first = states[:, 0]
+            tokens[active, i] = first[active]
+            done = active & ((rows < 0) | (self.ends[first] & (i > min_size)))
+            lengths[done] = i + 1
+            active &= ~done
+            if i + 1 == size or not active.any():
+                break
+            moving = np.nonzero(active)[0]
+            next_ids = self.advance(rows[moving]).astype(np.uint64)
+            shifted = np.concatenate([states[moving, 1:], next_ids[:, None]], axis=1)
+            states[moving] = shifted
+            rows[moving] = self.find_rows(shifted)
+        return [tokens[c, :lengths[c]].tolist() for c in range(n)]
+
+    def generate_text(self, seed_rows, size=139, min_size=20):
+        vocab = self.table.vocab
+        return [' '.join(vocab[i] for i in chain)
+                for chain in self.generate(seed_rows, size, min_size)]
@@ -0,0 +1,131 @@
+"""Distances from each state of a TransitionTable to the end of a sentence.
+
+Generation emits the first word of the current state, then moves to the state
+shifted by the next word. A state whose first word ends in .?! ends a
+sentence. For every row this module computes the fewest words and characters
+(words joined by single spaces) emitted until a sentence ends, and the
+expected number when successors are drawn by count.
+
+Minimums are found with Dijkstra's algorithm run backward from the sentence
+ending states over the reverse graph. Expectations solve
+E(s) = cost(s) + sum p(s, t) E(t) over the successors t that can still end a
+sentence, by sweeps in order of increasing minimum starting from the
+minimums, so they are approximate on graphs with long cycles.
+"""
+import heapq
+import random
+from array import array
+
+from model import unpack
+
+UNREACHABLE = (1 << 32) - 1     # minimum of a state that cannot reach a sentence end
+ENDINGS = '.?!'
+
+
+class LengthIndex(object):
+    """Per row minimum and expected words and characters to a sentence end"""
+
+    def __init__(self, table, sweeps=20):
+        self.table = table
+        vocab = table.vocab
+        shift = table.bits * (table.order - 1)
+        first = [key >> shift for key in table.keys]
+        self.lengths = array('I', (len(vocab[i]) for i in first))
+        self.ends = array('b', (vocab[i][-1] in ENDINGS for i in first))
+        self.next_rows = self._next_rows()
+
+        ones = [1] * len(first)
+        spaced = [length + 1 for length in self.lengths]
+        self.min_words = self._shortest(ones, ones)
+        self.min_chars = self._shortest(self.lengths, spaced)
+        self.expected_words = self._expected(self.min_words, ones, ones, sweeps)
+        self.expected_chars = self._expected(self.min_chars, self.lengths, spaced, sweeps)
+
+    def _next_rows(self):
+        """Returns array of the row reached by each transition, -1 if not in table"""
+        table = self.table
+        next_rows = array('i', [-1]) * len(table.next_ids)
+        for row in range(len(table.keys)):
+            following = unpack(table.keys[row], table.bits, table.order)[1:]
+            for i in range(table.offsets[row], table.offsets[row + 1]):
+                next_rows[i] = table.find_ids(following + (table.next_ids[i],))
+        return next_rows
+
+    def _shortest(self, end_costs, step_costs):
+        """Dijkstra from sentence ending rows along reversed transitions. A sentence
+            ending row costs end_costs[row], any other step_costs[row] plus its cheapest
+            successor"""
+        offsets, next_rows = self.table.offsets, self.next_rows
+        predecessors = [[] for _ in range(len(self.ends))]
+        for row in range(len(self.ends)):
+            if not self.ends[row]:
+                for i in range(offsets[row], offsets[row + 1]):
+                    if next_rows[i] >= 0:
+                        predecessors[next_rows[i]].append(row)
+
+        distance = array('I', [UNREACHABLE]) * len(self.ends)
+        heap = [(end_costs[row], row) for row in range(len(self.ends)) if self.ends[row]]
+        heapq.heapify(heap)
+        while heap:
+            cost, row = heapq.heappop(heap)
+            if cost >= distance[row]:
+                continue
+            distance[row] = cost
+            for previous in predecessors[row]:
+                through = cost + step_costs[previous]
+                if through < distance[previous]:
+                    heapq.heappush(heap, (through, previous))
+        return distance
+
+    def _expected(self, minimum, end_costs, step_costs, sweeps):
+        """Expected cost when each step draws among the successors that can end a sentence"""
+        offsets, next_rows, counts = self.table.offsets, self.next_rows, self.table.counts
+        expected = array('d', (float('inf') if m == UNREACHABLE else m for m in minimum))
+        order = sorted((m, row) for row, m in enumerate(minimum) if m != UNREACHABLE)
+        for _ in range(sweeps):
+            change = 0.0
+            for _, row in order:
+                if self.ends[row]:
+                    continue
+                total = weighted = 0.0
+                for i in range(offsets[row], offsets[row + 1]):
+                    following = next_rows[i]
+                    if following >= 0 and minimum[following] != UNREACHABLE:
+                        total += counts[i]
+                        weighted += counts[i] * expected[following]
+                value = step_costs[row] + weighted / total
+                change = max(change, abs(value - expected[row]))
+                expected[row] = value
+            if change < 0.01:
+                break
+        return expected
+
+    def distance(self, row):
+        """Returns (min words, min chars, expected words, expected chars) of a row"""
+        return (self.min_words[row], self.min_chars[row],
+                self.expected_words[row], self.expected_chars[row])
+
+    def walk(self, row, max_chars, min_words=0):
+        """Returns list of word ids of a text starting at row that ends a sentence within
+            max_chars characters, drawing each next word by count among the successors
+            from which that is still possible. The text runs past sentence ends while it
+            is shorter than min_words and can still end in budget. Raises ValueError if
+            row cannot end a sentence within max_chars"""
+        table = self.table
+        if self.min_chars[row] > max_chars:
+            raise ValueError('row {} cannot end a sentence within {} characters'
+                             .format(row, max_chars))
+        shift = table.bits * (table.order - 1)
+        words, used = [], -1
+        while True:
+            words.append(table.keys[row] >> shift)
+            used += self.lengths[row] + 1
+            candidates, weights = [], []
+            for i in range(table.offsets[row], table.offsets[row + 1]):
+                following = self.next_rows[i]
+                if following >= 0 and used + 1 + self.min_chars[following] <= max_chars:
+                    candidates.append(following)
+                    weights.append(table.counts[i])
+            if self.ends[row] and (len(words) >= min_words or not candidates):
+                return words
+            row = random.choices(candidates, weights)[0]
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Builds the model of every corpus in a set of directories, in parallel.
+
+    usage: python imposter/bulk.py [--processes 4] [--compact] [--force] [dirs ...]
+
+Every .txt file directly in CORPUS_FILES_DIR and LYRICS_DIR, or in the given
+directories, is a bot named after the file. Bots are built by a process pool,
+one Imposter per worker at a time and largest corpus first, so a big corpus is
+not left running alone at the end while the other workers sit idle. Each bot
+writes its model to a temporary file and renames it, and saves the source
+fingerprint only after that, so an interrupted build leaves the previous model
+in place and is redone on the next run.
+"""
+import argparse
+import os
+import time
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+from config import *
+from corpora import collect
+
+
+def discover(dirs=(CORPUS_FILES_DIR, LYRICS_DIR)):
+    """Returns list of (path, size) of the .txt files in dirs, largest first"""
+    corpora = []
+    for directory in dirs:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith('.txt') and os.path.isfile(path):
+                corpora.append((path, os.path.getsize(path)))
+    corpora.sort(key=lambda corpus: corpus[1], reverse=True)
+    return corpora
+
+
+def build(job):
+    """Builds one bot in a worker, returns dict of its name, size, seconds and error"""
+    from markov import Imposter
+    path, size, options, force = job
+    name = os.path.basename(path).split('.txt')[0]
+    if force:
+        fingerprint = os.path.join(BOTS_DIR, name, 'source.json')
+        if os.path.isfile(fingerprint):
+            os.remove(fingerprint)      # rebuild even though the corpus is unchanged
+    start = time.perf_counter()
+    error = None
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            Imposter(path, **options)
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+    return {'name': name, 'bytes': size, 'seconds': time.perf_counter() - start, 'error': error}
+
+
+def build_all(corpora, processes=None, force=False, **options):
+    """Builds a bot for each (path, size) of corpora in a pool of processes, printing each
+        as it finishes. options are passed to Imposter. Returns list of build results"""
+    jobs = [(path, size, options, force) for path, size in corpora]
+    start = time.perf_counter()
+    results = []
+    with Pool(processes) as pool:
+        for result in pool.imap_unordered(build, jobs):     # one job at a time, in order
+            results.append(result)
+            print('{name:<32} {bytes:>12,} bytes  {seconds:8.2f}s  {status}'.format(
+                status=result['error'] or 'ok', **result))
+    collect()       # stored copies of corpora that changed since the last build
+    wall = time.perf_counter() - start
+    serial = sum(result['seconds'] for result in results)
+    failed = sum(1 for result in results if result['error'])
+    print('{} bots, {} failed, {:.2f}s of builds in {:.2f}s: {:.2f}x speedup'.format(
+        len(results), failed, serial, wall, serial / wall if wall else 1))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('dirs', nargs='*', default=[CORPUS_FILES_DIR, LYRICS_DIR])
+    parser.add_argument('--processes', type=int, help='defaults to the number of cpus')
+    parser.add_argument('--compact', action='store_true', help='build compact models')
+    parser.add_argument('--order', type=int, default=2)
+    parser.add_argument('--force', action='store_true', help='rebuild unchanged corpora too')
+    args = parser.parse_args()
+    build_all(discover(args.dirs), args.processes, args.force, compact=args.compact,
+              order=args.order)
+
+
+if __name__ == '__main__':
+    main()
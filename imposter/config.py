@@ -5,6 +5,7 @@ IMPOSTER_DIR = os.path.join(PROJECT_ROOT, 'imposter')
 RESOURCES = os.path.join(PROJECT_ROOT, 'resources')
 CORPUS_FILES_DIR = os.path.join(RESOURCES, 'corpus_files')
 BOTS_DIR = os.path.join(IMPOSTER_DIR, 'bots')
+CORPUS_STORE_DIR = os.path.join(BOTS_DIR, '.corpora')
 LYRICS_DIR = os.path.join(CORPUS_FILES_DIR, 'lyrics')
 
 SCRAPED_URLS_DIR = os.path.join(PROJECT_ROOT, 'scraped_urls')
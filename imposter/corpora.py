@@ -0,0 +1,126 @@
+"""Content addressed storage of corpus files, shared by bot directories.
+
+Each distinct corpus is stored once in CORPUS_STORE_DIR, named by its sha1
+and the suffix of its compression, if any. A bot directory links its corpus
+file to the stored one with a hard link, or a symbolic link across file
+systems, so bots built from the same source share its bytes on disk and a
+bot whose source changed to a stored content only makes a link.
+
+Stored files are read-only and never written to. Before a bot adds to its
+corpus, unshare() replaces its link with a private, uncompressed copy.
+collect() removes stored files no bot directory links to. Anything deleting
+bot directories calls it afterwards, or uses remove_bot(), since a stored
+file outlives the last link to it.
+"""
+import gzip
+import os
+import shutil
+
+from config import *
+from corpus import SUFFIXES, compression_of, open_binary
+
+CORPUS_NAME = 'corpus.txt'
+
+
+def find_corpus(bot_dir):
+    """Returns path of the corpus file of a bot directory, None if it has none"""
+    for suffix in SUFFIXES.values():
+        path = os.path.join(bot_dir, CORPUS_NAME + suffix)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _write(source, path, compression):
+    tmp_path = path + '.tmp'
+    with open(source, 'rb') as src:
+        if compression == 'gzip':
+            with gzip.open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        elif compression == 'zstd':
+            import zstandard
+            with open(tmp_path, 'wb') as f, zstandard.ZstdCompressor().stream_writer(f) as dst:
+                shutil.copyfileobj(src, dst)
+        else:
+            with open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, path)
+
+
+def store(source, sha1, compression=None, store_dir=CORPUS_STORE_DIR):
+    """Returns path of the stored copy of source, whose content has hash sha1, storing
+        it first if there is none with that compression"""
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, sha1 + SUFFIXES[compression])
+    if not os.path.isfile(path):
+        _write(source, path, compression)
+    return path
+
+
+def link(stored, bot_dir):
+    """Links the corpus file of bot_dir to a stored corpus, replacing the corpus it had.
+        Returns path of the corpus file"""
+    path = os.path.join(bot_dir, CORPUS_NAME + SUFFIXES[compression_of(stored)])
+    if not (os.path.isfile(path) and os.path.samefile(stored, path)):
+        tmp_path = path + '.tmp'
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(stored, tmp_path)
+        except OSError:
+            os.symlink(os.path.abspath(stored), tmp_path)   # another file system
+        os.replace(tmp_path, path)
+    for suffix in SUFFIXES.values():
+        other = os.path.join(bot_dir, CORPUS_NAME + suffix)
+        if other != path and os.path.lexists(other):
+            os.remove(other)
+    return path
+
+
+def is_shared(path):
+    return os.path.islink(path) or os.stat(path).st_nlink > 1
+
+
+def unshare(path):
+    """Replaces a linked or compressed corpus file with a private uncompressed copy.
+        Returns path of the copy"""
+    plain = os.path.join(os.path.dirname(path), CORPUS_NAME)
+    if path == plain and not is_shared(path):
+        return path
+    tmp_path = plain + '.tmp'
+    with open_binary(path) as src, open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, plain)
+    if path != plain:
+        os.remove(path)
+    return plain
+
+
+def collect(store_dir=CORPUS_STORE_DIR, bots_dir=BOTS_DIR):
+    """Removes stored corpora that no bot directory links to. Returns bytes freed"""
+    if not os.path.isdir(store_dir):
+        return 0
+    linked = set()
+    for name in os.listdir(bots_dir):
+        path = find_corpus(os.path.join(bots_dir, name))
+        if path is not None:
+            info = os.stat(path)
+            linked.add((info.st_dev, info.st_ino))
+    freed = 0
+    for name in os.listdir(store_dir):
+        if name.endswith('.tmp'):
+            continue    # being stored
+        path = os.path.join(store_dir, name)
+        info = os.stat(path)
+        if (info.st_dev, info.st_ino) not in linked:
+            os.remove(path)
+            freed += info.st_size
+    return freed
+
+
+def remove_bot(bot_dir, store_dir=CORPUS_STORE_DIR):
+    """Removes a bot directory, and the stored corpora no other bot links to. Returns bytes
+        of stored corpora freed"""
+    shutil.rmtree(bot_dir, ignore_errors=True)
+    return collect(store_dir, os.path.dirname(os.path.abspath(bot_dir)))
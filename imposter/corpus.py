@@ -0,0 +1,61 @@
+"""Streaming access to corpus files.
+
+Corpora are read in fixed size chunks, so memory use does not depend on the
+size of the file, and states are produced with a sliding window in one pass.
+Files ending in .gz or .zst are decompressed as they are read, zstd needs the
+zstandard package.
+"""
+import gzip
+import io
+from collections import deque
+
+CHUNK_SIZE = 1 << 16    # characters read per chunk
+SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}   # file suffix of each compression
+
+
+def compression_of(path):
+    for compression, suffix in SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return None
+
+
+def open_binary(path):
+    """Opens a corpus file for reading bytes, decompressing it by its suffix"""
+    compression = compression_of(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+    return open(path, 'rb')
+
+
+def open_text(path):
+    return io.TextIOWrapper(open_binary(path))
+
+
+def iter_words(path, chunk_size=CHUNK_SIZE):
+    """Yields whitespace separated words of a file, reading it chunk by chunk"""
+    with open_text(path) as f:
+        partial = ''
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            words = (partial + chunk).split()
+            partial = ''
+            if words and not chunk[-1].isspace():
+                partial = words.pop()   # word may continue in next chunk
+            yield from words
+        if partial:
+            yield partial
+
+
+def iter_windows(words, size):
+    """Yields a tuple of every size consecutive words of an iterable"""
+    window = deque(maxlen=size)
+    for word in words:
+        window.append(word)
+        if len(window) == size:
+            yield tuple(window)
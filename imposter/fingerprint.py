@@ -0,0 +1,42 @@
+"""Content fingerprints of corpus files, to tell when a saved model is still current."""
+import hashlib
+import json
+import os
+
+HASH_CHUNK = 1 << 20
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, previous=None):
+    """Returns dict of size, mtime and sha1 of a file. The file is only hashed when its
+        size or mtime differ from the previous fingerprint"""
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if previous and all(previous.get(k) == v for k, v in fingerprint.items()):
+        fingerprint['sha1'] = previous['sha1']
+    else:
+        fingerprint['sha1'] = file_hash(path)
+    return fingerprint
+
+
+def load_fingerprint(path):
+    """Returns fingerprint saved at path, None if there is none"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_fingerprint(path, fingerprint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(fingerprint, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,92 @@
+"""Append-only store of generated results with a hash index of what was posted.
+
+Results go to results.txt as before, written in batches. Next to it,
+results.idx holds one 64 bit digest per distinct result (whitespace and case
+normalized), appended with each batch and loaded into a set once, so checking
+whether a text was produced before is O(1) and costs 8 bytes per result.
+Pending results are written when a batch fills, on flush(), and when the log
+is garbage collected or the interpreter exits. A log opened with writable
+False, as by shared model workers, keeps its results in memory only.
+"""
+import os
+import weakref
+from array import array
+from hashlib import blake2b
+
+FLUSH_RESULTS = 32      # results buffered before they are written
+
+
+def digest(text):
+    normalized = ' '.join(text.split()).casefold()
+    return int.from_bytes(blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _write(path, index_path, texts, digests):
+    if not os.path.isdir(os.path.dirname(path)):
+        return      # bot directory was removed
+    if texts:
+        with open(path, 'a') as f:
+            f.write(''.join('{}\n\n'.format(text) for text in texts))
+        del texts[:]
+    if digests:
+        with open(index_path, 'ab') as f:
+            digests.tofile(f)
+        del digests[:]
+
+
+class ResultLog(object):
+
+    def __init__(self, path, index_path, batch=FLUSH_RESULTS, writable=True):
+        self.path = path
+        self.index_path = index_path
+        self.batch = batch
+        self.writable = writable
+        self.seen = set()
+        self._texts = []                # not yet written
+        self._digests = array('Q')
+        if os.path.isfile(index_path):
+            stored = array('Q')
+            with open(index_path, 'rb') as f:
+                stored.frombytes(f.read())
+            self.seen.update(stored)
+        elif os.path.isfile(path):
+            self._index_existing()
+        if writable:
+            self._finalizer = weakref.finalize(self, _write, path, index_path, self._texts,
+                                               self._digests)
+
+    def _index_existing(self):
+        """Indexes a results file written before the index existed"""
+        with open(self.path) as f:
+            for text in f.read().split('\n\n'):
+                if text.strip():
+                    self._add_digest(digest(text))
+        if self.writable:
+            _write(self.path, self.index_path, [], self._digests)
+
+    def _add_digest(self, value):
+        if value not in self.seen:
+            self.seen.add(value)
+            if self.writable:
+                self._digests.append(value)
+
+    def __len__(self):
+        return len(self.seen)
+
+    def __contains__(self, text):
+        return digest(text) in self.seen
+
+    def append(self, text):
+        self._add_digest(digest(text))
+        if self.writable:
+            self._texts.append(text)
+            if len(self._texts) >= self.batch:
+                self.flush()
+
+    def extend(self, texts):
+        for text in texts:
+            self.append(text)
+
+    def flush(self):
+        if self.writable:
+            _write(self.path, self.index_path, self._texts, self._digests)
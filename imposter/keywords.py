@@ -0,0 +1,72 @@
+"""Generation around a given word, grown backward and forward from it.
+
+KeywordIndex maps each word, with surrounding punctuation stripped and case
+folded, to the states containing it and running totals of how often those
+states occur, so a state holding the keyword is drawn in one bisection. It
+also keeps reverse transitions: for every window (w0, w1 ... wn) the state
+(w1 ... wn) counts w0 as a word that preceded it. Drawing preceding words by
+those counts walks the chain backward, to the end of the previous sentence,
+with the same probabilities as generating forward into the keyword.
+"""
+import random
+import string
+from bisect import bisect_right
+from collections import Counter
+from itertools import accumulate
+
+ENDINGS = '.?!'
+
+
+def normalize(word):
+    return word.strip(string.punctuation).casefold()
+
+
+class KeywordIndex(object):
+    """Inverted index of words to states, and reverse transitions, of a model"""
+
+    def __init__(self, items):
+        """items yields (state, {next_word: count}), e.g. TransitionTable.items()"""
+        containing = {}     # word -> {state: weight}
+        self.previous = {}  # state -> Counter of words preceding it
+        for state, followers in items:
+            weight = sum(followers.values())
+            for word in set(map(normalize, state)):
+                if word:
+                    containing.setdefault(word, {})[state] = weight
+            rest = state[1:]
+            for word, count in followers.items():
+                self.previous.setdefault(rest + (word,), Counter())[state[0]] += count
+        self.states = {word: (list(weights), list(accumulate(weights.values())))
+                       for word, weights in containing.items()}
+        for state, words in self.previous.items():
+            self.previous[state] = (list(words), list(accumulate(words.values())))
+
+    def __contains__(self, word):
+        return normalize(word) in self.states
+
+    def sample_state(self, word):
+        """Returns a random state containing word, weighted by how often it occurs.
+            Raises KeyError if no state does"""
+        states, totals = self.states[normalize(word)]
+        return states[bisect_right(totals, int(random.random() * totals[-1]))]
+
+    def previous_word(self, state):
+        """Picks a word that preceded state, weighted by count. Raises KeyError if none did"""
+        words, totals = self.previous[state]
+        return words[bisect_right(totals, int(random.random() * totals[-1]))]
+
+    def grow_backward(self, state, limit):
+        """Returns up to limit words preceding state, back to the end of the previous
+            sentence or the start of corpus"""
+        words = []
+        while len(words) < limit:
+            try:
+                word = self.previous_word(state)
+            except KeyError:
+                break
+            if word[-1] in ENDINGS:
+                break
+            words.append(word)
+            state = (word,) + state[:-1]
+        words.reverse()
+        return words
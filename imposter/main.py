@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
+import logging
 import random
 import time
 import tweepy
 
 import markov
 from config import *
+from pregen import PostQueue
 from yikyakapi.yikyak import YikYak
 from secrets import *
 
@@ -40,9 +42,11 @@ def setup_tweeter():
 def main():
     yakker = setup_yakker()
     tweeter = setup_tweeter()
-    bot = markov.Imposter(os.path.join(CORPUS_FILES_DIR, 'newyork_mis.txt'))
+    bot = markov.Imposter(os.path.join(CORPUS_FILES_DIR, 'newyork_mis.txt'), unique=True)
+    posts = PostQueue(bot)      # generated on a background thread between posts
     while True:
-        new_post = bot.generate_text()
+        new_post = posts.get()
+        bot.flush_results()     # keep the posted index current between long sleeps
         try:
             tweeter.update_status(new_post)
             yakker.compose_yak(new_post, *SLO_COORDS)
@@ -54,6 +58,7 @@ def main():
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')     # building and loading
     main()
 
 
@@ -1,42 +1,114 @@
-import itertools
 import json
+import logging
 import random
-import shutil
+import sys
+import time
 from ast import literal_eval
+from collections import Counter
 
 import frogress
 
 from config import *
+from budget import LengthIndex
+from corpora import CORPUS_NAME, find_corpus, link, store, unshare
+from corpus import compression_of, iter_windows, iter_words
+from fingerprint import file_fingerprint, load_fingerprint, save_fingerprint
+from history import ResultLog
+from keywords import ENDINGS, KeywordIndex, normalize
+from metrics import Metrics
+from model import TransitionTable
+from modelfile import load_model, save_model
+from overlap import SHINGLE, CopyIndex
+from parallel import count_table
+from prune import prune_table
+from seeds import ModelSeeds, cache_seed_index
+from shared import attach_model, publish_model
+from store import SQLiteStore
+from wal import TransitionLog
+
+SEED_TRIES = 100        # seeds drawn for generate_text(max_chars=...) before giving up
+GENERATE_TRIES = 20     # texts generated before giving up when each is a copy or repost
+COMPACT_LOG_BYTES = 16 << 20    # size of the transition log that triggers a new snapshot
+FREEZE_STATES = 1 << 13     # states changed by ingest before a compact model's rows are laid out
+
+log = logging.getLogger('imposter')     # progress of builds, loads and saves, at INFO
 
 
 class Imposter(object):
 
-    def __init__(self, corpus_file):
+    def __init__(self, corpus_file, compact=False, order=2, processes=1, vectorized=False,
+                 name=None, vocab=None, metrics=None, max_overlap=None, unique=False,
+                 disk=False, shared=None, compression=None):
 
         self.file = corpus_file
+        self.bot_name = name        # defaults to the input file name
+        self.vocab = vocab          # Vocabulary shared with other models, see registry.py
         self.cache = {}
+        self.compact = compact      # store model as a count-based TransitionTable instead of cache
+        self.model = None
+        self.order = order          # words per state, each state predicts the next word
+        self.processes = processes  # worker processes used to build from corpus, see parallel.py
+        self.vectorized = vectorized    # build with numpy, see npbuild.py
+        self.disk = disk            # keep the model in SQLite instead of memory, see store.py
+        self.shared = shared        # name of a model published in shared memory, see publish
+        self.compression = compression  # 'gzip' or 'zstd' to store the corpus compressed
+        self._seeds = {}            # SeedIndex or ModelSeeds by sentence_start flag, see select_seed
+        self._batch = None          # BatchGenerator, see generate_batch
+        self._lengths = None        # LengthIndex, see length_index
+        self._keywords = None       # KeywordIndex, see keyword_index
+        self.max_overlap = max_overlap  # longest run of corpus words a generated text may copy
+        self._copies = None         # CopyIndex, see copy_index
+        self.unique = unique        # skip texts generated before, see history.py
+        self.metrics = metrics if metrics is not None else Metrics()    # see stats
         self.word_count = 0
         self.create_directory()
+        self.log = TransitionLog(self.delta_file)     # changes since the last save, see wal.py
+        # a shared bot checks against the publisher's results but leaves them to it to write
+        self.history = ResultLog(self.result_file, self.history_file, writable=shared is None)
         self._build_cache()
+        if max_overlap is not None:
+            self.copy_index()
 
     def __repr__(self):
         return self.name
 
     @property
     def name(self):
+        if self.bot_name:
+            return self.bot_name
         path = self.file.split('.txt')[0]
         return path.split('/')[-1]
 
     def create_directory(self):
         self.bot_dir = os.path.join(BOTS_DIR, self.name)
+        self.corpus_file = find_corpus(self.bot_dir) or os.path.join(self.bot_dir, CORPUS_NAME)
+        if self.shared is not None:
+            # the directory and corpus belong to the publishing bot
+            self.saved_source = self.source = None
+            self.source_changed = False
+            return
         os.makedirs(self.bot_dir, exist_ok=True)
 
-        self.corpus_file = os.path.join(self.bot_dir, 'corpus.txt')
-        open(self.corpus_file, 'a').close()
+        # link the stored copy of input file into bot directory, unless it is unchanged since
+        # it was last linked, see corpora.py
+        self.saved_source = load_fingerprint(self.fingerprint_file)
+        self.source = file_fingerprint(self.file, self.saved_source)
+        self.source_changed = (self.saved_source is None
+                               or self.saved_source['sha1'] != self.source['sha1']
+                               or not os.path.isfile(self.corpus_file))
+        if self.source_changed and os.path.abspath(self.file) != os.path.abspath(self.corpus_file):
+            stored = store(self.file, self.source['sha1'], self.compression)
+            self.corpus_file = link(stored, self.bot_dir)
 
-        #copy input file to bot directory
-        shutil.copyfile(self.file, self.corpus_file)
+    @property
+    def fingerprint_file(self):
+        """Size, mtime and hash of the input file the saved cache was built from"""
+        return os.path.join(self.bot_dir, 'source.json')
 
+    def _save_fingerprint(self):
+        if self.source != self.saved_source:
+            save_fingerprint(self.fingerprint_file, self.source)
+            self.saved_source = self.source
 
     @property
     def cache_file(self):
@@ -45,11 +117,36 @@ class Imposter(object):
             open(path, 'a').close()
         return path                 #TODO return file handler instead of path, to skip opening in other methods
 
+    @property
+    def model_file(self):
+        """Binary model used in compact mode, see modelfile.py"""
+        return os.path.join(self.bot_dir, 'model.bin')
+
+    @property
+    def store_file(self):
+        """SQLite model used with disk, see store.py"""
+        return os.path.join(self.bot_dir, 'model.sqlite')
+
+    @property
+    def delta_file(self):
+        """Log of transitions added to corpus since the cache or model was last saved"""
+        return os.path.join(self.bot_dir, 'cache.wal')
+
+    @property
+    def snapshot_file(self):
+        """File the cache or model is saved to, that delta_file applies to"""
+        return self.model_file if self.model is not None else self.cache_file
+
     @property
     def result_file(self):
         path = os.path.join(self.bot_dir, 'results.txt')
         return path
 
+    @property
+    def history_file(self):
+        """Digests of the texts in result_file"""
+        return os.path.join(self.bot_dir, 'results.idx')
+
     def add_to_corpus(self, text):
         """Text may be a string of text or filepath. Content is added to corpus file,
             and becomes accessible with self.words"""
@@ -59,32 +156,108 @@ class Imposter(object):
             self.add_text_to_corpus(text)
 
     def add_text_to_corpus(self, string):
-        with open(self.corpus_file, 'a') as f:
-            f.write('\n' + string + '\n')
-        self._rebuild_cache()
+        self._ingest('\n' + string + '\n')
 
     def add_file_to_corpus(self, path):
-        with open(self.corpus_file, 'a') as corpus:
-            with open(path, 'r') as f:
-                for line in f.readlines():
-                    corpus.write(line)
-        self._rebuild_cache()
+        with open(path, 'r') as f:
+            self._ingest(f.read())
+
+    def _corpus_tail(self, count):
+        """Returns (text, complete) where text is the end of the corpus holding more than
+            count words, or the whole corpus in which case complete is True"""
+        size = os.path.getsize(self.corpus_file)
+        chunk = 1024
+        with open(self.corpus_file, 'rb') as f:
+            while True:
+                start = max(0, size - chunk)
+                f.seek(start)
+                tail = f.read().decode('utf-8', errors='ignore')
+                if start == 0 or len(tail.split()) > count:
+                    return tail, start == 0
+                chunk *= 2
+
+    def _ingest(self, text):
+        """Appends text to corpus and merges only the transitions it changes into the cache.
+            Windows across the old end of corpus are recounted, since the last word may be
+            joined to the start of text. The change is appended to delta_file, which is
+            compacted into a new snapshot once it grows past COMPACT_LOG_BYTES. A compact
+            model lays out its changed states once there are more than FREEZE_STATES"""
+        if self.shared is not None:
+            raise ValueError('a shared model is read-only, add text to the publishing bot')
+        size = self.order + 1
+        self.corpus_file = unshare(self.corpus_file)    # stored corpora are never written to
+        tail, complete = self._corpus_tail(size)
+        with open(self.corpus_file, 'a') as f:
+            f.write(text)
+        self._copies = None
+
+        before, after = tail.split(), (tail + text).split()
+        if not complete:
+            before, after = before[1:], after[1:]   # first word may be cut off
+        start = max(0, len(before) - size)
+        delta = Counter(iter_windows(after[start:], size))
+        delta.subtract(iter_windows(before[start:], size))
+        delta = {window: count for window, count in delta.items() if count}
+
+        self._apply_delta(delta)
+        if self.disk:
+            self.model.commit()     # the database keeps its own journal
+            return
+        with self.metrics.timer('log'):
+            self.log.append(delta, self.snapshot_file)
+        if self.log.size > COMPACT_LOG_BYTES:
+            self._save_cache()
+        elif self.model is not None and len(self.model.delta) > FREEZE_STATES:
+            self.model.freeze()     # keeps redrawing seeds of the changed states cheap
+            self._reset_indexes()
+
+    def _apply_delta(self, delta):
+        """Adds {window: count} to the cache, negative counts remove occurrences"""
+        self._keywords = None
+        if self.model is not None:
+            self.model.update(delta)
+            for seeds in self._seeds.values():
+                seeds.changed()     # rows stay as they are, only the changed states are redone
+            return
+        self._seeds = {}
+        self._batch = None
+        self._lengths = None
+        for window, count in delta.items():
+            key, word = window[:-1], window[-1]
+            if count > 0:
+                self.cache.setdefault(key, []).extend([word] * count)
+            elif key in self.cache:
+                for _ in range(min(-count, self.cache[key].count(word))):
+                    self.cache[key].remove(word)
+                if not self.cache[key]:
+                    del self.cache[key]
+
+    def _replay_delta(self, snapshot=None):
+        """Applies changes logged in delta_file on top of the cache or model loaded from
+            snapshot, by default snapshot_file. Returns True if there were any"""
+        replayed = False
+        with self.metrics.timer('replay'):
+            for delta in self.log.replay(snapshot or self.snapshot_file):
+                self._apply_delta(delta)
+                replayed = True
+        return replayed
+
+    def _clear_delta(self):
+        self.log.clear()
 
     @property
     def words(self):
         self.word_count = 0
-        with open(self.corpus_file) as f:
-            for line in f.readlines():
-                for word in line.split():
-                    self.word_count += 1
-                    yield word
+        for word in self.metrics.timed_iter('corpus_read', iter_words(self.corpus_file)):
+            self.word_count += 1
+            yield word
+        self.metrics.count('words_read', self.word_count)
 
     @property
-    def raw_states(self, order=6):
-        steps = []
-        for i in range(order):
-            steps.append(itertools.islice(self.words, i, None))
-        yield from zip(*steps)
+    def raw_states(self):
+        """Yields every run of order + 1 words in corpus: a state and the word after it"""
+        windows = iter_windows(self.words, self.order + 1)
+        yield from self.metrics.timed_iter('extract', windows, exclude='corpus_read')
 
 
     @property
@@ -100,14 +273,44 @@ class Imposter(object):
 
 
     def _save_cache(self):
-        """Writes cache dictionary to json file.
+        """Writes cache dictionary to json file, or the model to model_file in compact mode.
             Always overwrites file, so must load and update data before saving updates.
+            Changes made since are only logged, see _ingest
+        """
+        if self.shared is not None:
+            raise ValueError('a shared model is read-only, the publishing bot saves it')
+        log.info('saving data')
+        self._reset_indexes()   # rows are renumbered when the model is laid out for saving
+        with self.metrics.timer('save'):
+            if self.disk:
+                self.model.commit()
+                self.model.index_seeds()
+            elif self.model is not None:
+                save_model(self.model, self.model_file)
+            else:
+                self.export_json(self.cache_file)
+        self._clear_delta()     # changes are now in the saved file
+
+    def export_json(self, path):
+        """Writes cache or model to path in the cache.json format.
             Cache keys converted from tuple -> str for json
         """
-        print('saving data')
-        with open(self.cache_file, 'w') as f:
-            data = {str(k): v for k, v in self.cache.items()}  # convert tuple key into string for json
-            json.dump(data, f, indent=2)
+        cache = self.model.to_cache() if self.model is not None else self.cache
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            data = {str(k): v for k, v in cache.items()}  # convert tuple key into string for json
+            json.dump(data, f)
+        os.replace(tmp_path, path)      # a crash leaves the previous snapshot intact
+
+    def import_json(self, path):
+        """Loads a cache.json formatted file into the cache, or the model in compact mode"""
+        with open(path) as f:
+            data = json.load(f)
+        if self.model is not None:
+            self.cache = self.model.to_cache()
+            self.model = None
+        self.load_saved_cache(data)
+
     @property
     def data(self):
         """Opens and loads JSON data into memory, does not add to cache
@@ -117,62 +320,285 @@ class Imposter(object):
                 data = json.load(f)
                 return data
         except json.JSONDecodeError:
-            print('no data found')
+            log.info('no data found')
             return None
 
     def _build_cache(self):
-        """Builds cache from json, if data previously saved.
+        """Builds cache from json, if data previously saved from an unchanged input file.
             Otherwise builds cache by generating states from corpus
         """
-        print('Building cache...')
+        log.info('Building cache...')
         assert self.cache == {}
-        if self.data:
-            print('loading data from json')
-            self.load_saved_cache()
-        else:
-            print('from states')
-            self._build_cache_from_corpus()
-        self._save_cache()
+        if self.shared is not None:
+            self.model = attach_model(self.shared)
+            self.compact = True
+            self._reset_indexes()
+            return
+        if self.source_changed:
+            log.info('corpus changed')
+        elif self.disk and os.path.isfile(self.store_file):
+            with self.metrics.timer('load'):
+                store = SQLiteStore(self.store_file, self.order)
+            if store.order == self.order:
+                log.info('loading model from %s', self.store_file)
+                self.model = store
+                self._reset_indexes()
+                self._save_fingerprint()
+                return
+            store.close()
+        elif self.compact and os.path.isfile(self.model_file):
+            with self.metrics.timer('load'):
+                try:
+                    model = load_model(self.model_file)
+                except ValueError:
+                    model = None    # written in an older format, built again below
+                if model is not None and model.order == self.order and self.vocab is not None:
+                    model = model.rebase(self.vocab)
+            if model is not None and model.order == self.order:
+                log.info('loading model from %s', self.model_file)
+                self.model = model
+                self._reset_indexes()
+                self._replay_delta()
+                self._save_fingerprint()
+                return
+        elif not self.disk:
+            with self.metrics.timer('load'):
+                data = self.data
+                loaded = bool(data) and len(literal_eval(next(iter(data)))) == self.order
+                if loaded:
+                    log.info('loading data from json')
+                    self.load_saved_cache(data)
+            if loaded:
+                self._replay_delta(self.cache_file)     # stays logged until the next snapshot
+                if self.compact:
+                    self._save_cache()      # compact mode converts cache.json to model_file once
+                self._save_fingerprint()
+                return
+        log.info('from states')
+        self._build_cache_from_corpus()     # saves cache
+        self._save_fingerprint()
 
     def _build_cache_from_corpus(self):
         """Parses states from corpus file and loads them into cache"""
-        print('Populating cache with word_states')
-        try:
-            for state in frogress.bar(self.raw_states):
-                key = (state[0], state[1])
-                if key in self.cache:
-                    self.cache[key].append(state[2])
+        log.info('Populating cache with word_states')
+        with self.metrics.timer('build', exclude='save'):
+            if self.disk:
+                self.model = SQLiteStore.from_windows(self.store_file,
+                                                      frogress.bar(self.raw_states), self.order)
+                self._save_cache()      # nothing to save if the build failed
+                return
+            if self.processes > 1 and not compression_of(self.corpus_file):  # can not be sharded
+                try:
+                    self._build_cache_in_parallel()
+                finally:
+                    self._save_cache()
+                return
+            if self.vectorized:
+                from npbuild import build_table
+                words = self.metrics.timed_iter('corpus_read', iter_words(self.corpus_file))
+                table = build_table(words, self.order, self.vocab)
+                if self.compact:
+                    self.model = table
                 else:
-                    self.cache[key] = [state[2]]  # values are list of words
-        except KeyboardInterrupt:
-            print('Saving data and quiting')
-        finally:
-            self._save_cache()
+                    self.cache = table.to_cache()
+                self._save_cache()
+                return
+            if self.compact:
+                try:
+                    self.model = TransitionTable.from_windows(frogress.bar(self.raw_states), self.order,
+                                                              self.vocab)
+                finally:
+                    self._save_cache()
+                return
+            try:
+                for state in frogress.bar(self.raw_states):
+                    key = state[:-1]
+                    if key in self.cache:
+                        self.cache[key].append(state[-1])
+                    else:
+                        self.cache[key] = [state[-1]]  # values are list of words
+            except KeyboardInterrupt:
+                log.info('Saving data and quiting')
+            finally:
+                self._save_cache()
+
+    def _build_cache_in_parallel(self):
+        """Counts states over shards of corpus in self.processes worker processes"""
+        table = count_table(self.corpus_file, self.order, self.processes, frogress.bar)
+        if self.vocab is not None:
+            table = table.rebase(self.vocab)
+        if self.compact:
+            self.model = table
+        else:
+            self.cache = table.to_cache()
 
-    def load_saved_cache(self):
+    def load_saved_cache(self, data=None):
         """Loads saved states data from json into cache.
             Doesn't overwrite cache item if in-memory item has larger value"""
-        if self.data:
-            for k, v in self.data.items():
+        if data is None:
+            data = self.data
+        self._reset_indexes()
+        if data:
+            for k, v in data.items():
                 key = literal_eval(k)
                 if key in self.cache.keys():
                     if len(v) <= len(self.cache[key]):
                         continue
                 self.cache[key] = v
+        if self.compact:
+            self.model = TransitionTable.from_cache(self.cache, self.vocab, self.order)
+            self.cache = {}
         return self.cache
 
     def _rebuild_cache(self):
         """Builds cache only from corpus, cache is then saved to update json"""
         self.cache = {}
+        self.model = None
         self._build_cache_from_corpus()
 
-    def select_seed(self):
-        seed_idx = random.randint(0, len(self.cache) - 3)
-        seed_words = itertools.islice(self.words, seed_idx, seed_idx + 2)
-        return(tuple(seed_words))
+    def _saved_file(self):
+        return self.model_file if self.model is not None else self.cache_file
 
-    def generate_text(self, size=139, min_size=20):  #FOR ENDING WITH END OF SENTENCE
-        new_word, next_word = self.select_seed()
+    def _time_load(self):
+        """Returns seconds taken to load the saved model or cache file"""
+        start = time.perf_counter()
+        if self.model is not None:
+            load_model(self.model_file)
+        else:
+            with open(self.cache_file) as f:
+                {literal_eval(k): v for k, v in json.load(f).items()}
+        return time.perf_counter() - start
+
+    def prune(self, min_count=1, top_k=None, drop_dead_ends=True):
+        """Drops transitions seen fewer than min_count times, keeps the top_k most frequent
+            successors of each state and removes dead end states, see prune.py. Saves the
+            smaller model and returns dict of its size and load time before and after"""
+        log.info('pruning %s', self.name)
+        if self.disk:
+            raise ValueError('pruning needs an in-memory model')
+        if self.model is None and not os.path.getsize(self.cache_file):
+            self._save_cache()
+        before = dict(self.stats()['model'], file_bytes=os.path.getsize(self._saved_file()),
+                      load_s=self._time_load())
+        with self.metrics.timer('prune', exclude='save'):
+            if self.model is not None:
+                self.model = prune_table(self.model, min_count, top_k, drop_dead_ends)
+            else:
+                table = TransitionTable.from_cache(self.cache, order=self.order)
+                self.cache = prune_table(table, min_count, top_k, drop_dead_ends).to_cache()
+            self._save_cache()
+        if self.model is not None:
+            self.model = load_model(self.model_file)    # mapped, without the words pruned away
+            if self.vocab is not None:
+                self.model = self.model.rebase(self.vocab)
+        after = dict(self.stats()['model'], file_bytes=os.path.getsize(self._saved_file()),
+                     load_s=self._time_load())
+        log.info('states %d -> %d, file %.1f -> %.1f MB, load %.3fs -> %.3fs',
+                 before['states'], after['states'], before['file_bytes'] / 1e6,
+                 after['file_bytes'] / 1e6, before['load_s'], after['load_s'])
+        return {'before': before, 'after': after}
+
+    def publish(self, name=None):
+        """Copies the saved model into shared memory for generation workers, which open it
+            with Imposter(corpus_file, shared=published.name). Returns the SharedModel, whose
+            close() removes the segment, see shared.py"""
+        if self.model is None or self.disk:
+            raise ValueError('publishing needs a compact model')
+        if self.model.delta or self.log.size:
+            self._save_cache()      # publish the transitions added since the last save
+        return publish_model(self.model_file, name)
+
+    @property
+    def state_count(self):
+        return len(self.model) if self.model is not None else len(self.cache)
+
+    def next_word(self, state):
+        """Picks a random word to follow state, weighted by how often it followed in corpus"""
+        if self.model is not None:
+            return self.model.choose(state)
+        return random.choice(self.cache[state])
+
+    def next_words(self, state, k):
+        """Picks k independent next words for state, for generating many candidates at once"""
+        if self.model is not None:
+            return self.model.choose_many(state, k)
+        return random.choices(self.cache[state], k=k)
+
+    def _reset_indexes(self):
+        """Drops indexes derived from the cache or model, they are rebuilt when next used"""
+        self._seeds = {}
+        self._batch = None
+        self._lengths = None
+        self._keywords = None
+
+    def seed_index(self, sentence_start=False):
+        """Returns index of states weighted by frequency, or of sentence starting states.
+            Built once per cache or model layout, so seeding never reads the corpus"""
+        if sentence_start not in self._seeds:
+            if self.model is not None:
+                index = ModelSeeds(self.model, sentence_start)
+            else:
+                index = cache_seed_index(self.cache, sentence_start)
+            self._seeds[sentence_start] = index
+        return self._seeds[sentence_start]
+
+    def select_seed(self, sentence_start=False):
+        """Returns a random state to start generating from in O(1). With sentence_start,
+            only states that begin a sentence in corpus are picked"""
+        if self.disk:
+            return self.model.sample_state(sentence_start)
+        return self.seed_index(sentence_start).sample()
+
+    def length_index(self):
+        """Returns LengthIndex of distances from each state to a sentence end, built once
+            per cache or model layout, see budget.py. It covers the rows of a compact model,
+            which take in added text when they are laid out again, see _ingest"""
+        if self.disk:
+            raise ValueError('length budgets need an in-memory model')
+        if self._lengths is None:
+            if self.model is not None:
+                self._lengths = LengthIndex(self.model)
+            else:
+                self._lengths = LengthIndex(TransitionTable.from_cache(self.cache, order=self.order))
+        return self._lengths
+
+    def generate_text(self, size=139, min_size=20, sentence_start=False, max_chars=None,
+                      keyword=None):  #FOR ENDING WITH END OF SENTENCE
+        """With max_chars, generation is steered to end a sentence within that many
+            characters instead of stopping at size words. With keyword, the text is grown
+            backward and forward from a state containing that word"""
+        result = self.draft(size, min_size, sentence_start, max_chars, keyword)
+        self.write_result(result)
+        self.metrics.count('posts')
+        return result
+
+    def draft(self, size=139, min_size=20, sentence_start=False, max_chars=None, keyword=None,
+              exclude=()):
+        """Generates a text like generate_text without recording it as posted. With unique,
+            texts in exclude are skipped too, see pregen.py"""
+        if keyword is not None and max_chars is not None:
+            raise ValueError('keyword and max_chars can not be combined')
+        with self.metrics.timer('generate'):
+            for _ in range(GENERATE_TRIES):
+                if keyword is not None:
+                    result = self._generate_around(keyword, size, min_size)
+                elif max_chars is not None:
+                    result = self._generate_within(max_chars, min_size, sentence_start)
+                else:
+                    result = self._generate_text(size, min_size, sentence_start)
+                # exclude first, a queued text is written to history before it leaves exclude
+                if self.unique and (result in exclude or result in self.history):
+                    self.metrics.count('duplicates_skipped')
+                elif self.max_overlap is not None and self.longest_overlap(result) > self.max_overlap:
+                    self.metrics.count('copies_rejected')
+                else:
+                    return result
+        raise ValueError('no new text without long copies of corpus in {} tries'
+                         .format(GENERATE_TRIES))
+
+    def _generate_text(self, size, min_size, sentence_start):
+        state = self.select_seed(sentence_start)
+        new_word = state[0]
         new_word[0].upper()
         result = []
         for i in range(size):
@@ -181,18 +607,143 @@ class Imposter(object):
                 break
             if len(result) == 140:
                 break
-            new_word, next_word = next_word, random.choice(self.cache[(new_word, next_word)])
+            try:
+                state = state[1:] + (self.next_word(state),)
+            except KeyError:
+                break       # last state of corpus, nothing follows it
+            new_word = state[0]
 
         # result.append(next_word)
         result = ' '.join(result)
-
-        self.write_result(result)
         return result
 
 
+    def keyword_index(self):
+        """Returns KeywordIndex of the states containing each word and of reverse
+            transitions, built once per cache or model, see keywords.py"""
+        if self._keywords is None:
+            if self.model is not None:
+                self._keywords = KeywordIndex(self.model.items())
+            else:
+                self._keywords = KeywordIndex((k, Counter(v)) for k, v in self.cache.items())
+        return self._keywords
+
+    def _generate_around(self, keyword, size, min_size):
+        index = self.keyword_index()
+        if keyword not in index:
+            raise ValueError('{} is not in corpus'.format(keyword))
+        state = index.sample_state(keyword)
+        before = index.grow_backward(state, size - self.order)
+        words = before + list(state)
+        # the sentence starts after the last end before the keyword
+        position = len(before) + [normalize(w) for w in state].index(normalize(keyword))
+        ends = [i for i in range(position) if words[i][-1] in ENDINGS]
+        if ends:
+            words = words[ends[-1] + 1:]
+        while len(words) < size and not (words[-1][-1] in ENDINGS and len(words) > min_size):
+            try:
+                state = state[1:] + (self.next_word(state),)
+            except KeyError:
+                break       # last state of corpus, nothing follows it
+            words.append(state[-1])
+        return ' '.join(words)
+
+    def _generate_within(self, max_chars, min_size, sentence_start):
+        index = self.length_index()
+        table = index.table
+        for _ in range(SEED_TRIES):
+            row = table.find(self.select_seed(sentence_start))
+            if row >= 0 and index.min_chars[row] <= max_chars:
+                break
+        else:
+            raise ValueError('no seed found that ends a sentence within {} characters'
+                             .format(max_chars))
+        words = index.walk(row, max_chars, min_size + 2)   # ends like i > min_size above
+        return ' '.join(table.vocab[i] for i in words)
+
+    def copy_index(self):
+        """Returns CopyIndex over the words of corpus, see overlap.py. Built once, and
+            again after text is added to corpus"""
+        if self._copies is None:
+            shingle = SHINGLE
+            if self.max_overlap is not None:
+                shingle = max(1, min(SHINGLE, self.max_overlap + 1))   # catch any longer copy
+            with self.metrics.timer('copy_index'):
+                self._copies = CopyIndex(self.words, shingle)
+        return self._copies
+
+    def longest_overlap(self, text):
+        """Returns number of words in the longest run of text found verbatim in corpus"""
+        return self.copy_index().longest_overlap(text)[0]
+
+    def generate_batch(self, n, size=139, min_size=20, sentence_start=False):
+        """Generates n posts at once, advancing all chains in lockstep with numpy, and
+            writes them to result_file in one go. Needs numpy, see batch.py. With unique,
+            texts generated before are left out, so fewer than n may be returned"""
+        with self.metrics.timer('generate_batch'):
+            results = self._generate_batch(n, size, min_size, sentence_start)
+        self.metrics.count('posts', len(results))
+        return results
+
+    def _generate_batch(self, n, size, min_size, sentence_start):
+        if self.disk:
+            raise ValueError('batch generation needs an in-memory model')
+        if self._batch is None:
+            from batch import BatchGenerator
+            if self.model is not None:
+                self._batch = BatchGenerator(self.model)    # over its rows, like length_index
+            else:
+                self._batch = BatchGenerator(TransitionTable.from_cache(self.cache, order=self.order))
+        if sentence_start and len(self._batch.table.sentence_starts()[0]):
+            rows = self._batch.sample_starts(n)
+        else:
+            rows = self._batch.sample_rows(n)
+        results = self._batch.generate_text(rows, size, min_size)
+        if self.unique:
+            new = []
+            for result in results:
+                if result not in self.history:
+                    self.write_result(result)
+                    new.append(result)
+            self.metrics.count('duplicates_skipped', len(results) - len(new))
+            return new
+        self.write_results(results)
+        return results
+
+    def stats(self):
+        """Returns dict of model size: states, distinct transitions, vocabulary and
+            approximate bytes in memory, with the timers and counters of self.metrics"""
+        if self.disk:
+            size = {'states': len(self.model), 'transitions': self.model.transition_count,
+                    'vocabulary': self.model.vocabulary_size, 'bytes': self.model.nbytes}
+        elif self.model is not None:
+            size = {'states': len(self.model), 'transitions': self.model.transition_count,
+                    'vocabulary': len(self.model.vocab), 'bytes': self.model.nbytes}
+        else:
+            vocab, transitions = set(), 0
+            nbytes = sys.getsizeof(self.cache)
+            for state, followers in self.cache.items():
+                distinct = set(followers)
+                transitions += len(distinct)
+                vocab.update(state)
+                vocab.update(distinct)
+                nbytes += sys.getsizeof(state) + sys.getsizeof(followers)
+            nbytes += sum(sys.getsizeof(word) for word in vocab)
+            size = {'states': len(self.cache), 'transitions': transitions,
+                    'vocabulary': len(vocab), 'bytes': nbytes}
+        stats = {'name': self.name, 'compact': self.compact, 'order': self.order, 'model': size}
+        stats.update(self.metrics.summary())
+        return stats
+
     def write_result(self, result):
-        with open(self.result_file, 'a+') as f:
-            f.write('{}\n\n'.format(result))
+        """Queues result for result_file, which is written in batches, see flush_results"""
+        self.history.append(result)
+
+    def write_results(self, results):
+        self.history.extend(results)
+
+    def flush_results(self):
+        self.history.flush()
 
 
 
@@ -0,0 +1,299 @@
+"""Merges saved binary models at the transition count level, see modelfile.py.
+
+Model files keep their words sorted and number them in that order, so mapping
+each model's ids into the sorted union of all words keeps their order, and
+with it the order of the packed state keys. The models' rows can therefore be
+merged like sorted lists: the inputs are mapped and read front to back, and
+output sections are spooled to temporary files until the header is known, so
+neither the inputs nor the result have to fit in memory. Only the vocabulary
+mapping is held.
+
+Disk bots are merged straight from their SQLite store, see store.py. Their
+words are numbered in sorted order like a model file's. Their windows come in
+the store's text order, so they are sorted by packed ids on disk with
+_SortedRuns before they join the merge. Sentence start weights are sorted the
+same way before they are matched to the written rows.
+"""
+import heapq
+import mmap
+import os
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+from model import TransitionTable, pack, unpack
+from modelfile import load_model, save_model, write_model
+
+FLUSH_ITEMS = 1 << 16     # items buffered per output section between writes
+READ_ITEMS = 1 << 12      # items read at a time from each run of a _SortedRuns
+
+
+class _Spool(object):
+    """Output section written to a temporary file in buffered chunks"""
+
+    def __init__(self, typecode, directory):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.typecode = typecode
+        self.buffer = array(typecode)
+        self.flushed = 0
+
+    def __len__(self):
+        return self.flushed + len(self.buffer)
+
+    def append(self, value):
+        self.buffer.append(value)
+        if len(self.buffer) >= FLUSH_ITEMS:
+            self.flush()
+
+    def write(self, data):
+        self.flush()
+        self.file.write(data)
+        self.flushed += len(data)
+
+    def flush(self):
+        self.buffer.tofile(self.file)
+        self.flushed += len(self.buffer)
+        self.buffer = array(self.typecode)
+
+    def rewind(self):
+        self.flush()
+        self.file.seek(0)
+        return self.file
+
+
+class _SortedRuns(object):
+    """(key, value, count) items sorted on disk: up to FLUSH_ITEMS distinct (key, value)
+        are summed and sorted in memory, then spooled as a run. Iterating merges the runs
+        and yields items in order, with the counts of equal (key, value) summed"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.pending = Counter()
+        self.runs = []
+
+    def add(self, key, value, count):
+        self.pending[key, value] += count
+        if len(self.pending) >= FLUSH_ITEMS:
+            self._spill()
+
+    def _spill(self):
+        run = array('Q')
+        for (key, value), count in sorted(self.pending.items()):
+            run.extend((key, value, count))
+        f = tempfile.TemporaryFile(dir=self.directory)
+        run.tofile(f)
+        self.runs.append(f)
+        self.pending = Counter()
+
+    @staticmethod
+    def _read(f):
+        f.seek(0)
+        while True:
+            chunk = array('Q')
+            chunk.frombytes(f.read(3 * chunk.itemsize * READ_ITEMS))
+            if not chunk:
+                return
+            items = iter(chunk)
+            yield from zip(items, items, items)
+
+    def __iter__(self):
+        if self.pending:
+            self._spill()
+        merged = heapq.merge(*(self._read(f) for f in self.runs))
+        for (key, value), group in groupby(merged, key=itemgetter(0, 1)):
+            yield key, value, sum(count for _, _, count in group)
+
+    def close(self):
+        for f in self.runs:
+            f.close()
+
+
+class _ModelSource(object):
+    """Merge input reading a model file row by row"""
+
+    def __init__(self, table):
+        self.table = table
+        self.order = table.order
+
+    def words(self):
+        """Yields (UTF-8 word, id) in word order"""
+        vocab = self.table.vocab
+        for i in range(len(vocab)):
+            yield vocab._encoded(i), i
+
+    def rows(self, remap, bits):
+        """Yields (key, [(next id, count), ...]) of every row in key order, in merged ids"""
+        t = self.table
+        for row in range(len(t.keys)):
+            key = pack([remap[i] for i in unpack(t.keys[row], t.bits, t.order)], bits)
+            yield key, [(remap[t.next_ids[i]], t.counts[i])
+                        for i in range(t.offsets[row], t.offsets[row + 1])]
+
+
+class _StoreSource(object):
+    """Merge input reading a SQLiteStore, whose windows are sorted in directory"""
+
+    def __init__(self, store, directory):
+        self.store = store
+        self.order = store.order
+        self.directory = directory
+        words = set()
+        for state, followers in store.items():
+            words.update(state)
+            words.update(followers)
+        self.sorted_words = sorted(words)
+
+    def words(self):
+        for i, word in enumerate(self.sorted_words):
+            yield word.encode('utf-8'), i
+
+    def rows(self, remap, bits):
+        ids = {word: remap[i] for i, word in enumerate(self.sorted_words)}
+        self.sorted_words = None
+        runs = _SortedRuns(self.directory)
+        try:
+            for state, followers in self.store.items():
+                key = pack([ids[word] for word in state], bits)
+                for word, count in followers.items():
+                    runs.add(key, ids[word], count)
+            del ids
+            for key, group in groupby(runs, key=itemgetter(0)):
+                yield key, [(next_id, count) for _, next_id, count in group]
+        finally:
+            runs.close()
+
+
+def _merge_vocabularies(sources, blob, word_offsets):
+    """Writes the sorted union of the sources' words. Returns, per source, an array
+        mapping its word ids to ids in the union, and an array of flags marking the
+        union's words that end a sentence"""
+    def tagged(index, source):
+        for word, word_id in source.words():
+            yield word, index, word_id
+
+    remaps = [array('I') for _ in sources]
+    enders = array('b')
+    offset = 0
+    word_offsets.append(0)
+    for word, entries in groupby(heapq.merge(*(tagged(n, s) for n, s in enumerate(sources))),
+                                 key=itemgetter(0)):
+        blob.write(word)
+        offset += len(word)
+        word_offsets.append(offset)
+        for _, index, word_id in entries:
+            remap = remaps[index]
+            if len(remap) <= word_id:
+                remap.extend(bytes(4 * (word_id + 1 - len(remap))))
+            remap[word_id] = len(enders)
+        enders.append(word[-1:] in (b'.', b'?', b'!'))
+    return remaps, enders
+
+
+def merge_models(paths, path, weights=None):
+    """Writes the model whose counts are the sum of the counts of the models in paths,
+        each multiplied by its weight, default 1, and rounded. Transitions rounded to
+        zero are left out"""
+    _merge([_ModelSource(load_model(p)) for p in paths], path, weights)
+
+
+def _merge(sources, path, weights=None):
+    weights = weights or [1] * len(sources)
+    if len(weights) != len(sources):
+        raise ValueError('need one weight per model')
+    order = sources[0].order
+    if any(s.order != order for s in sources):
+        raise ValueError('models of different order cannot be merged')
+
+    directory = os.path.dirname(os.path.abspath(path))
+    word_offsets, blob = _Spool('Q', directory), _Spool('B', directory)
+    remaps, enders = _merge_vocabularies(sources, blob, word_offsets)
+    n_words = len(enders)
+    bits = max(1, (n_words - 1).bit_length())
+    if order * bits > 64:
+        raise ValueError('state keys of order {} do not fit 64 bits'.format(order))
+
+    keys, offsets = _Spool('Q', directory), _Spool('Q', directory)
+    next_ids, counts, cumulative = (_Spool('I', directory), _Spool('I', directory),
+                                    _Spool('Q', directory))
+    offsets.append(0)
+    total = 0
+    starts = _SortedRuns(directory)
+
+    def tagged(index, source):
+        for key, followers in source.rows(remaps[index], bits):
+            yield key, index, followers
+
+    rows = heapq.merge(*(tagged(n, s) for n, s in enumerate(sources)), key=itemgetter(0))
+    for key, group in groupby(rows, key=itemgetter(0)):
+        merged = Counter()
+        for _, index, followers in group:
+            weight = weights[index]
+            for next_id, count in followers:
+                merged[next_id] += count * weight
+        state = unpack(key, bits, order)
+        written = 0
+        for next_id in sorted(merged):
+            count = int(round(merged[next_id]))
+            if count <= 0:
+                continue
+            next_ids.append(next_id)
+            counts.append(count)
+            total += count
+            cumulative.append(total)
+            written += 1
+            if enders[state[0]]:
+                starts.add(pack(state[1:] + (next_id,), bits), 0, count)
+        if written:
+            keys.append(key)
+            offsets.append(len(next_ids))
+
+    # sentence starts are states of the merged rows, found by bisecting the written keys
+    seed_rows, seed_totals = array('I'), array('Q')
+    seed_total = 0
+    key_file = keys.rewind()
+    if len(keys):
+        with mmap.mmap(key_file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            written_keys = memoryview(mapping).cast('Q')
+            row = 0
+            for key, _, count in starts:
+                row = bisect_left(written_keys, key, row)
+                if row < len(written_keys) and written_keys[row] == key:
+                    seed_total += count
+                    seed_rows.append(row)
+                    seed_totals.append(seed_total)
+            written_keys.release()
+    starts.close()
+
+    write_model(path, order, bits, n_words, len(keys), len(next_ids), len(blob), len(seed_rows),
+                (word_offsets.rewind(), blob.rewind(), key_file, offsets.rewind(),
+                 next_ids.rewind(), counts.rewind(), cumulative.rewind(), seed_rows, seed_totals))
+    for spool in (word_offsets, blob, keys, offsets, next_ids, counts, cumulative):
+        spool.file.close()
+
+
+def merge_bots(bots, path, weights=None):
+    """Merges the saved models of Imposter bots into a model file at path. Disk bots are
+        read from their store, legacy cache bots are converted to a model file first"""
+    sources, converted = [], []
+    try:
+        for bot in bots:
+            if bot.disk:
+                sources.append(_StoreSource(bot.model, bot.bot_dir))
+                continue
+            if bot.model is not None:
+                if bot.model.delta or bot.log.size or not os.path.isfile(bot.model_file):
+                    bot._save_cache()   # changes only logged since model_file was saved
+                model_file = bot.model_file
+            else:
+                handle, model_file = tempfile.mkstemp(suffix='.bin', dir=bot.bot_dir)
+                os.close(handle)
+                converted.append(model_file)
+                save_model(TransitionTable.from_cache(bot.cache, order=bot.order), model_file)
+            sources.append(_ModelSource(load_model(model_file)))
+        _merge(sources, path, weights)
+    finally:
+        for tmp_path in converted:
+            os.remove(tmp_path)
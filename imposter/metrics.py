@@ -0,0 +1,78 @@
+"""Timers and counters for the build, load and generation paths of Imposter.
+
+Each measurement is kept in memory for Metrics.summary and passed to every
+hook as hook(kind, name, value), where kind is 'timer' (value in seconds) or
+'counter' (value is the increment), so numbers can be forwarded to a metrics
+system as they are recorded.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+BATCH = 4096    # items drawn per clock read when timing an iterator
+
+
+class Metrics(object):
+
+    def __init__(self, hooks=()):
+        self.timers = {}            # name -> [calls, total seconds, max seconds]
+        self.counters = Counter()
+        self.hooks = list(hooks)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def total(self, name):
+        """Seconds recorded under a timer name so far"""
+        return self.timers[name][1] if name in self.timers else 0.0
+
+    def record(self, name, seconds):
+        timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+        for hook in self.hooks:
+            hook('timer', name, seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+        for hook in self.hooks:
+            hook('counter', name, n)
+
+    @contextmanager
+    def timer(self, name, exclude=None):
+        """Times the block under name. Time recorded meanwhile under the exclude
+            timer, e.g. a save done inside a build, is not counted twice"""
+        excluded = self.total(exclude)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.record(name, elapsed - (self.total(exclude) - excluded))
+
+    def timed_iter(self, name, iterable, exclude=None):
+        """Yields from iterable, recording the time spent producing its items under
+            name once it is exhausted or closed. The clock is read once per BATCH items"""
+        iterator = iter(iterable)
+        excluded = self.total(exclude)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                items = list(islice(iterator, BATCH))
+                elapsed += time.perf_counter() - start
+                if not items:
+                    break
+                yield from items
+        finally:
+            self.record(name, elapsed - (self.total(exclude) - excluded))
+
+    def summary(self):
+        """Returns dict of timers, each with calls, total, mean and max seconds, and counters"""
+        timers = {}
+        for name, (calls, total, longest) in self.timers.items():
+            timers[name] = {'calls': calls, 'total_s': total, 'mean_s': total / calls,
+                            'max_s': longest}
+        return {'timers': timers, 'counters': dict(self.counters)}
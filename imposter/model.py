@@ -0,0 +1,419 @@
+"""Compact, count-based storage for Markov transitions.
+
+Words are interned to integer ids by a Vocabulary. A TransitionTable keeps one
+row per state (a tuple of `order` word ids) holding each distinct next word id
+once, together with how many times it followed that state. Rows are laid out
+in flat arrays, sorted by packed state key:
+
+    keys[i]                             packed word ids of state i
+    next_ids[offsets[i]:offsets[i+1]]   ids of words seen after state i
+    counts[offsets[i]:offsets[i+1]]     occurrences of each of those words
+"""
+import random
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate
+
+SLOT_BITS = 32      # bits per word id while counting, before vocab size is known
+SLOT_MASK = (1 << SLOT_BITS) - 1
+
+
+def pack(ids, bits):
+    """Packs a sequence of word ids into one int, first id in the highest bits"""
+    key = 0
+    for word_id in ids:
+        key = (key << bits) | word_id
+    return key
+
+
+def unpack(key, bits, length):
+    mask = (1 << bits) - 1
+    ids = [0] * length
+    for i in range(length - 1, -1, -1):
+        ids[i] = key & mask
+        key >>= bits
+    return tuple(ids)
+
+
+class Vocabulary(object):
+    """Two-way mapping between words and consecutive integer ids"""
+
+    def __init__(self, words=()):
+        self.words = []
+        self.ids = {}
+        for word in words:
+            self.intern(word)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.ids
+
+    def __getitem__(self, word_id):
+        return self.words[word_id]
+
+    def get(self, word, default=None):
+        return self.ids.get(word, default)
+
+    def intern(self, word):
+        """Returns id of word, adding it to the vocabulary if not yet seen"""
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = self.ids[word] = len(self.words)
+            self.words.append(word)
+        return word_id
+
+    @property
+    def nbytes(self):
+        size = sys.getsizeof(self.words) + sys.getsizeof(self.ids)
+        return size + sum(sys.getsizeof(w) for w in self.words)
+
+
+class Sampler(object):
+    """Weighted successor sampling over the rows of a TransitionTable.
+        cumulative[i] is the running total of counts over the whole table, so each
+        draw is one bisect bounded to a row: O(log fanout) however skewed the row is"""
+
+    def __init__(self, table, cumulative=None):
+        self.offsets = table.offsets
+        self.next_ids = table.next_ids
+        if cumulative is None:
+            cumulative = array('Q', accumulate(table.counts))
+        self.cumulative = cumulative
+
+    def bounds(self, row):
+        """Returns (lo, hi, base, total) of a row, base being the running total before it"""
+        lo, hi = self.offsets[row], self.offsets[row + 1]
+        base = self.cumulative[lo - 1] if lo else 0
+        return lo, hi, base, self.cumulative[hi - 1] - base
+
+    def sample(self, row):
+        """Returns a successor word id of row"""
+        lo, hi, base, total = self.bounds(row)
+        target = base + int(random.random() * total)
+        return self.next_ids[bisect_right(self.cumulative, target, lo, hi)]
+
+    def sample_many(self, row, k):
+        """Returns k independent successor word ids of row"""
+        lo, hi, base, total = self.bounds(row)
+        if hi - lo == 1:
+            return [self.next_ids[lo]] * k
+        cumulative, next_ids, rand = self.cumulative, self.next_ids, random.random
+        return [next_ids[bisect_right(cumulative, base + int(rand() * total), lo, hi)]
+                for _ in range(k)]
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.cumulative)
+
+
+class TransitionTable(object):
+    """Markov model storing (next word, count) pairs per state in arrays.
+        Equivalent to Imposter.cache, where each next word is stored once per occurrence"""
+
+    def __init__(self, order=2, vocab=None):
+        self.order = order
+        self.vocab = vocab if vocab is not None else Vocabulary()
+        self.bits = 1
+        self.keys = array('Q')
+        self.offsets = array('Q', [0])
+        self.next_ids = array('I')
+        self.counts = array('I')
+        self.sampler = Sampler(self)
+        self.delta = {}     # state ids -> {next_id: count} of states changed by update()
+        self.starts = None  # (rows, totals) of sentence starting states, see sentence_starts()
+
+    def __len__(self):
+        size = len(self.keys)
+        for state, followers in self.delta.items():
+            in_rows = self.find_ids(state) >= 0
+            if followers and not in_rows:
+                size += 1
+            elif in_rows and not followers:
+                size -= 1
+        return size
+
+    def __contains__(self, state):
+        try:
+            self._locate(state)
+        except KeyError:
+            return False
+        return True
+
+    @classmethod
+    def from_windows(cls, windows, order=2, vocab=None):
+        """Builds table from word tuples of length order + 1, e.g. Imposter.raw_states"""
+        table = cls(order, vocab)
+        intern = table.vocab.intern
+        counter = Counter()
+        for window in windows:
+            counter[pack(map(intern, window), SLOT_BITS)] += 1
+        table._load_counter(counter)
+        return table
+
+    @classmethod
+    def from_counts(cls, counts, order=2, vocab=None):
+        """Builds table from a mapping of {window: count}, windows being word tuples"""
+        table = cls(order, vocab)
+        intern = table.vocab.intern
+        counter = Counter()
+        for window, count in counts.items():
+            counter[pack(map(intern, window), SLOT_BITS)] += count
+        table._load_counter(counter)
+        return table
+
+    @classmethod
+    def from_sorted(cls, windows, order=2, vocab=None):
+        """Builds table from (window, count) pairs in window order, without repeats, each
+            window packing order + 1 ids of vocab in as many bits as the table uses per id,
+            e.g. merged from parallel.py shards"""
+        table = cls(order, vocab)
+        table._load_windows(windows, max(1, (len(table.vocab) - 1).bit_length()))
+        return table
+
+    @classmethod
+    def from_arrays(cls, order, bits, vocab, keys, offsets, next_ids, counts, cumulative=None):
+        """Wraps prebuilt rows, e.g. memoryviews over a mapped model file, without copying"""
+        table = cls(order, vocab)
+        table.bits = bits
+        table.keys = keys
+        table.offsets = offsets
+        table.next_ids = next_ids
+        table.counts = counts
+        table.sampler = Sampler(table, cumulative)
+        return table
+
+    @classmethod
+    def from_cache(cls, cache, vocab=None, order=2):
+        """Builds table from a legacy cache dict of {(w1, w2): [next_word, ...]}"""
+        order = len(next(iter(cache))) if cache else order
+        table = cls(order, vocab)
+        intern = table.vocab.intern
+        counter = Counter()
+        for state, followers in cache.items():
+            state_key = pack(map(intern, state), SLOT_BITS) << SLOT_BITS
+            for word in followers:
+                counter[state_key | intern(word)] += 1
+        table._load_counter(counter)
+        return table
+
+    def rebase(self, vocab):
+        """Returns a copy of the table with word ids taken from another vocabulary,
+            interning its words there. Lets several tables share one vocabulary"""
+        remap = array('I', (vocab.intern(self.vocab[i]) for i in range(len(self.vocab))))
+        counter = Counter()
+        for state, followers in self.id_items():
+            state_key = pack([remap[i] for i in state], SLOT_BITS) << SLOT_BITS
+            for next_id, count in followers.items():
+                counter[state_key | remap[next_id]] = count
+        table = TransitionTable(self.order, vocab)
+        table._load_counter(counter)
+        return table
+
+    def to_cache(self):
+        """Expands table back into the legacy cache dict format"""
+        cache = {}
+        for state, followers in self.items():
+            cache[state] = [w for w, count in followers.items() for _ in range(count)]
+        return cache
+
+    def _key_array(self):
+        """Packed keys fit an unsigned 64 bit array unless order * bits is too wide"""
+        return array('Q') if self.order * self.bits <= 64 else []
+
+    def _load_counter(self, counter):
+        """Lays out counts of slot-packed (state + next word) windows as sorted rows"""
+        self._load_windows(((window, counter[window]) for window in sorted(counter)), SLOT_BITS)
+
+    def _load_windows(self, windows, bits):
+        """Lays out (window, count) pairs in window order, each window packing order + 1
+            ids of bits each, as rows"""
+        self.bits = max(1, (len(self.vocab) - 1).bit_length())
+        self.keys = self._key_array()
+        self.offsets = array('Q', [0])
+        self.next_ids = array('I')
+        self.counts = array('I')
+        mask = (1 << bits) - 1
+        previous = None
+        for window, count in windows:
+            state = window >> bits
+            if state != previous:
+                if previous is not None:
+                    self.offsets.append(len(self.next_ids))
+                if bits == self.bits:
+                    self.keys.append(state)
+                else:
+                    self.keys.append(pack(unpack(state, bits, self.order), self.bits))
+                previous = state
+            self.next_ids.append(window & mask)
+            self.counts.append(count)
+        if previous is not None:
+            self.offsets.append(len(self.next_ids))
+        self.sampler = Sampler(self)
+        self.starts = None
+
+    def state_ids(self, state):
+        """Returns tuple of word ids for a tuple of words, None if a word is unknown"""
+        ids = tuple(self.vocab.get(word) for word in state)
+        return None if None in ids else ids
+
+    def find(self, state):
+        """Returns row index of a state given as words, -1 if not in table"""
+        ids = self.state_ids(state)
+        if ids is None:
+            return -1
+        return self.find_ids(ids)
+
+    def find_ids(self, ids):
+        if max(ids) >> self.bits:
+            return -1   # word interned after rows were laid out
+        key = pack(ids, self.bits)
+        row = bisect_left(self.keys, key)
+        if row < len(self.keys) and self.keys[row] == key:
+            return row
+        return -1
+
+    def row_state(self, row):
+        """Returns the state of a row as a tuple of words"""
+        ids = unpack(self.keys[row], self.bits, self.order)
+        return tuple(self.vocab[i] for i in ids)
+
+    def row_ids(self, row):
+        """Returns {next_id: count} of a row"""
+        lo, hi = self.offsets[row], self.offsets[row + 1]
+        return {self.next_ids[i]: self.counts[i] for i in range(lo, hi)}
+
+    def row_successors(self, row):
+        lo, hi = self.offsets[row], self.offsets[row + 1]
+        return {self.vocab[self.next_ids[i]]: self.counts[i] for i in range(lo, hi)}
+
+    def _locate(self, state):
+        """Returns (row, followers) of a state given as words. followers is its
+            {next_id: count} dict if update() changed it, otherwise None and row is
+            its index. Raises KeyError if state has no successors"""
+        ids = self.state_ids(state)
+        if ids is not None:
+            if ids in self.delta:
+                if self.delta[ids]:
+                    return -1, self.delta[ids]
+            else:
+                row = self.find_ids(ids)
+                if row >= 0:
+                    return row, None
+        raise KeyError(state)
+
+    def successors(self, state):
+        """Returns dict of {next_word: count} for a state, raises KeyError if unknown"""
+        row, followers = self._locate(state)
+        if followers is None:
+            return self.row_successors(row)
+        return {self.vocab[i]: count for i, count in followers.items()}
+
+    def id_items(self):
+        """Yields (state ids, {next_id: count}) of every state, including changes from update()"""
+        for row in range(len(self.keys)):
+            state = unpack(self.keys[row], self.bits, self.order)
+            if state not in self.delta:
+                yield state, self.row_ids(row)
+        for state, followers in self.delta.items():
+            if followers:
+                yield state, followers
+
+    def items(self):
+        vocab = self.vocab
+        for state, followers in self.id_items():
+            yield (tuple(vocab[i] for i in state),
+                   {vocab[i]: count for i, count in followers.items()})
+
+    def choose(self, state):
+        """Picks next word for state with probability proportional to its count,
+            same distribution as random.choice over the legacy list of next words"""
+        row, followers = self._locate(state)
+        if followers is None:
+            return self.vocab[self.sampler.sample(row)]
+        return self.vocab[random.choices(list(followers), list(followers.values()))[0]]
+
+    def choose_many(self, state, k):
+        """Returns k independent picks of next word for state"""
+        row, followers = self._locate(state)
+        if followers is None:
+            ids = self.sampler.sample_many(row, k)
+        else:
+            ids = random.choices(list(followers), list(followers.values()), k=k)
+        return [self.vocab[i] for i in ids]
+
+    def update(self, windows):
+        """Merges a Counter of windows (word tuples of length order + 1) into the table.
+            Negative counts remove occurrences. Changed states are held in self.delta,
+            so the cost depends on the size of the update rather than of the table"""
+        intern = self.vocab.intern
+        for window, count in windows.items():
+            ids = tuple(map(intern, window))
+            state, next_id = ids[:-1], ids[-1]
+            followers = self.delta.get(state)
+            if followers is None:
+                row = self.find_ids(state)
+                followers = self.delta[state] = self.row_ids(row) if row >= 0 else {}
+            followers[next_id] = followers.get(next_id, 0) + count
+            if followers[next_id] <= 0:
+                del followers[next_id]
+
+    def freeze(self):
+        """Lays out states changed by update() into sorted rows with the others"""
+        if not self.delta:
+            return
+        counter = Counter()
+        for state, followers in self.id_items():
+            state_key = pack(state, SLOT_BITS) << SLOT_BITS
+            for next_id, count in followers.items():
+                counter[state_key | next_id] = count
+        self.delta = {}
+        self._load_counter(counter)
+
+    def sentence_starts(self):
+        """Returns (rows, totals) of states that follow a word ending in .?!, in row order,
+            and the running total of how often they do. A state (w1, w2) starts a sentence as
+            often as the window (end, w1, w2) occurs, so these are read off the rows whose
+            state begins with such a word"""
+        if self.starts is None:
+            enders = array('b', (self.vocab[i][-1] in '.?!' for i in range(len(self.vocab))))
+            shift = self.bits * (self.order - 1)
+            weights = Counter()
+            for row in range(len(self.keys)):
+                if enders[self.keys[row] >> shift]:
+                    state = unpack(self.keys[row], self.bits, self.order)[1:]
+                    for next_id, count in self.row_ids(row).items():
+                        weights[state + (next_id,)] += count
+            rows, totals = array('I'), array('Q')
+            total = 0
+            for state in sorted(weights):
+                row = self.find_ids(state)
+                if row >= 0:
+                    total += weights[state]
+                    rows.append(row)
+                    totals.append(total)
+            self.starts = rows, totals
+        return self.starts
+
+    @property
+    def transition_count(self):
+        """Distinct (state, next word) pairs, including changes from update()"""
+        count = len(self.next_ids)
+        for state, followers in self.delta.items():
+            row = self.find_ids(state)
+            if row >= 0:
+                count -= self.offsets[row + 1] - self.offsets[row]
+            count += len(followers)
+        return count
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the table and its vocabulary"""
+        size = sum(sys.getsizeof(a) for a in (self.offsets, self.next_ids, self.counts))
+        size += sys.getsizeof(self.keys) + self.sampler.nbytes
+        if isinstance(self.keys, list):
+            size += sum(sys.getsizeof(k) for k in self.keys)
+        return size + self.vocab.nbytes
@@ -0,0 +1,206 @@
+"""Binary on-disk format for TransitionTable models, opened with mmap.
+
+Layout, every section padded to a multiple of 8 bytes:
+
+    header          magic, version, byte order, order, bits and section sizes
+    word_offsets    uint64[n_words + 1]  word i is blob[word_offsets[i]:word_offsets[i+1]]
+    blob            utf-8 words, in sorted order so ids can be found by bisection
+    keys            uint64[n_states]     packed state ids, sorted
+    offsets         uint64[n_states + 1] row i spans offsets[i]:offsets[i+1]
+    next_ids        uint32[n_transitions]
+    counts          uint32[n_transitions]
+    cumulative      uint64[n_transitions] running totals of counts, for the Sampler
+    seed_rows       uint32[n_seeds]      rows of states that start a sentence
+    seed_totals     uint64[n_seeds]      running totals of how often those start a sentence
+
+Loading only parses the header and creates memoryviews over the mapping, so
+pages are read from disk as generation touches them.
+"""
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from model import TransitionTable, Vocabulary, pack, unpack
+
+MAGIC = b'IMPOSTER'
+VERSION = 3
+HEADER = struct.Struct('<8sHHHHQQQQQ')    # 56 bytes, keeps the sections 8 byte aligned
+BYTE_ORDERS = {'little': 1, 'big': 2}
+
+
+def _padding(size):
+    return -size % 8
+
+
+class MappedVocabulary(object):
+    """Vocabulary read from a model file. Words are decoded on access and looked up
+        by bisecting the sorted blob. Words interned after loading are kept in memory
+        and get ids following the mapped ones"""
+
+    def __init__(self, word_offsets, blob):
+        self.word_offsets = word_offsets
+        self.blob = blob
+        self.mapped_count = len(word_offsets) - 1
+        self.words = []     # words added since the file was written
+        self.ids = {}
+
+    def __len__(self):
+        return self.mapped_count + len(self.words)
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def __getitem__(self, word_id):
+        if word_id >= self.mapped_count:
+            return self.words[word_id - self.mapped_count]
+        start, end = self.word_offsets[word_id], self.word_offsets[word_id + 1]
+        return str(self.blob[start:end], 'utf-8')
+
+    def _encoded(self, word_id):
+        return bytes(self.blob[self.word_offsets[word_id]:self.word_offsets[word_id + 1]])
+
+    def get(self, word, default=None):
+        target = word.encode('utf-8')
+        lo, hi = 0, self.mapped_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._encoded(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.mapped_count and self._encoded(lo) == target:
+            return lo
+        return self.ids.get(word, default)
+
+    def intern(self, word):
+        word_id = self.get(word)
+        if word_id is None:
+            word_id = self.ids[word] = len(self)
+            self.words.append(word)
+        return word_id
+
+    @property
+    def nbytes(self):
+        size = sys.getsizeof(self.words) + sys.getsizeof(self.ids)
+        return size + sum(sys.getsizeof(w) for w in self.words)
+
+
+def _canonical_rows(table):
+    """Returns (words, keys, offsets, next_ids, counts) with the words used by table
+        renumbered in sorted order. Rows already in that order are returned as they are"""
+    used = set(table.next_ids)
+    for key in table.keys:
+        used.update(unpack(key, table.bits, table.order))
+    used = sorted(used, key=table.vocab.__getitem__)
+    words = [table.vocab[i] for i in used]
+    bits = max(1, (len(words) - 1).bit_length())
+    if used == list(range(len(table.vocab))) and bits == table.bits:
+        return words, table.keys, table.offsets, table.next_ids, table.counts
+
+    remap = dict(zip(used, range(len(used))))
+    rekeyed = []
+    for row in range(len(table.keys)):
+        ids = unpack(table.keys[row], table.bits, table.order)
+        rekeyed.append((pack([remap[i] for i in ids], bits), row))
+    rekeyed.sort()
+
+    keys, offsets = array('Q'), array('Q', [0])
+    next_ids, counts = array('I'), array('I')
+    for key, row in rekeyed:
+        lo, hi = table.offsets[row], table.offsets[row + 1]
+        for i in sorted(range(lo, hi), key=lambda i: remap[table.next_ids[i]]):
+            next_ids.append(remap[table.next_ids[i]])
+            counts.append(table.counts[i])
+        keys.append(key)
+        offsets.append(len(next_ids))
+    return words, keys, offsets, next_ids, counts
+
+
+def save_model(table, path):
+    """Writes table to path in binary format. The file is replaced atomically"""
+    table.freeze()
+    words, keys, offsets, next_ids, counts = _canonical_rows(table)
+    if table.order * max(1, (len(words) - 1).bit_length()) > 64:
+        raise ValueError('state keys of order {} do not fit 64 bits'.format(table.order))
+    encoded = [w.encode('utf-8') for w in words]
+    blob = b''.join(encoded)
+    word_offsets = array('Q', [0])
+    word_offsets.extend(accumulate(len(w) for w in encoded))
+    bits = max(1, (len(words) - 1).bit_length())
+    canonical = TransitionTable.from_arrays(table.order, bits, Vocabulary(words), keys,
+                                            offsets, next_ids, counts)
+    seed_rows, seed_totals = canonical.sentence_starts()
+    write_model(path, table.order, bits, len(words), len(keys), len(next_ids), len(blob),
+                len(seed_rows), (word_offsets, blob, array('Q', keys), array('Q', offsets),
+                                 array('I', next_ids), array('I', counts),
+                                 canonical.sampler.cumulative, seed_rows, seed_totals))
+
+
+def write_model(path, order, bits, n_words, n_states, n_transitions, blob_size, n_seeds,
+                sections):
+    """Writes header and the nine sections in file order, each a buffer or a binary file
+        read from its current position. The file at path is replaced atomically"""
+    header = HEADER.pack(MAGIC, VERSION, BYTE_ORDERS[sys.byteorder], order, bits,
+                         n_words, n_states, n_transitions, blob_size, n_seeds)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for section in sections:
+            if hasattr(section, 'read'):
+                start = f.tell()
+                shutil.copyfileobj(section, f)
+                size = f.tell() - start
+            else:
+                size = len(memoryview(section).cast('B'))
+                f.write(section)
+            f.write(b'\0' * _padding(size))
+    os.replace(tmp_path, path)
+
+
+def load_model(path):
+    """Maps a binary model file and returns a TransitionTable reading from it"""
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return open_buffer(mapping)
+
+
+def open_buffer(buffer):
+    """Returns a TransitionTable over a buffer holding a binary model. The table
+        keeps a reference to buffer, which must stay open while the table is used"""
+    view = memoryview(buffer)
+    (magic, version, byte_order, order, bits,
+     n_words, n_states, n_transitions, blob_size, n_seeds) = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not an imposter model file')
+    if byte_order != BYTE_ORDERS[sys.byteorder]:
+        raise ValueError('model file was written with a different byte order')
+
+    position = HEADER.size
+
+    def section(typecode, count, itemsize):
+        nonlocal position
+        size = count * itemsize
+        data = view[position:position + size]
+        position += size + _padding(size)
+        return data if typecode == 'B' else data.cast(typecode)
+
+    word_offsets = section('Q', n_words + 1, 8)
+    blob = section('B', blob_size, 1)
+    keys = section('Q', n_states, 8)
+    offsets = section('Q', n_states + 1, 8)
+    next_ids = section('I', n_transitions, 4)
+    counts = section('I', n_transitions, 4)
+    cumulative = section('Q', n_transitions, 8)
+    seed_rows = section('I', n_seeds, 4)
+    seed_totals = section('Q', n_seeds, 8)
+
+    vocab = MappedVocabulary(word_offsets, blob)
+    table = TransitionTable.from_arrays(order, bits, vocab, keys, offsets, next_ids,
+                                        counts, cumulative)
+    table.starts = seed_rows, seed_totals
+    table.buffer = buffer
+    return table
@@ -0,0 +1,62 @@
+"""Builds a TransitionTable with numpy instead of one dict update per window.
+
+Words are interned to an int32 id array. Each window of order + 1 ids is
+packed into one uint64 (first word in the highest bits), so np.unique with
+return_counts sorts and counts all transitions at once. Because the packing
+puts the state ahead of the next word, the sorted windows are already grouped
+by state, in the same order as TransitionTable.keys.
+"""
+from array import array
+from itertools import islice
+
+import numpy as np
+
+from model import TransitionTable, Vocabulary
+
+CHUNK_WORDS = 1 << 20
+
+
+def intern_words(words, vocab):
+    """Returns int32 array of the id of each word, adding new words to vocab"""
+    words = iter(words)
+    chunks = []
+    while True:
+        chunk = list(islice(words, CHUNK_WORDS))
+        if not chunk:
+            break
+        # only the distinct words of a chunk go through python, lookups stay in C
+        for word in dict.fromkeys(chunk):
+            if word not in vocab.ids:
+                vocab.intern(word)
+        chunks.append(np.fromiter(map(vocab.ids.__getitem__, chunk), np.int32, len(chunk)))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+
+
+def build_table(words, order=2, vocab=None):
+    """Returns TransitionTable of an iterable of words, e.g. Imposter.words"""
+    vocab = vocab if vocab is not None else Vocabulary()
+    ids = intern_words(words, vocab).astype(np.uint64)
+    bits = max(1, (len(vocab) - 1).bit_length())
+    if (order + 1) * bits > 64:
+        raise ValueError('windows of order {} do not fit 64 bits'.format(order))
+
+    count = len(ids) - order
+    if count <= 0:
+        return TransitionTable(order, vocab)
+    windows = np.zeros(count, dtype=np.uint64)
+    for j in range(order + 1):
+        windows = (windows << np.uint64(bits)) | ids[j:j + count]
+    windows, counts = np.unique(windows, return_counts=True)
+
+    states = windows >> np.uint64(bits)
+    starts = np.flatnonzero(np.concatenate(([True], states[1:] != states[:-1])))
+    offsets = np.append(starts, len(windows)).astype(np.uint64)
+    next_ids = (windows & np.uint64((1 << bits) - 1)).astype(np.uint32)
+    counts = counts.astype(np.uint32)
+    return TransitionTable.from_arrays(
+        order, bits, vocab,
+        array('Q', states[starts].tobytes()),
+        array('Q', offsets.tobytes()),
+        array('I', next_ids.tobytes()),
+        array('I', counts.tobytes()),
+        array('Q', np.cumsum(counts, dtype=np.uint64).tobytes()))
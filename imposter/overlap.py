@@ -0,0 +1,111 @@
+"""Finds the longest run of words a text shares verbatim with the corpus.
+
+The corpus is kept as an array of word ids. Every run of `shingle` words is
+hashed with a polynomial rolling hash, and the hashes are sorted together
+with their positions, so the corpus positions starting with the same words
+as some place in a text are found by bisection. A shingle with at most
+MAX_CANDIDATES positions has every one of them as a candidate, extended word
+by word only if it agrees with the text at the length of the longest match
+so far. The positions of a more common shingle are sorted by the EXTEND
+words that follow it, so the longest of them match the text's words there
+are the two either side of where those words bisect in. Only those two are
+extended, which bounds the work per text position. The overlap found is
+exact up to shingle + EXTEND words. Past that, positions that agree on all
+EXTEND words are tied, and the one extended gives a length of at least
+shingle + EXTEND, possibly shorter than the longest. Hash collisions are
+harmless since matches are checked against the ids.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import groupby
+
+from model import Vocabulary
+
+SHINGLE = 4             # words hashed per position, overlaps shorter than this are not found
+MAX_CANDIDATES = 64     # positions of a shingle scanned, those of commoner ones are bisected
+EXTEND = 32             # words after a common shingle its positions are sorted by
+BASE = 1000003
+MASK = (1 << 64) - 1
+ID_MASK = (1 << 32) - 1  # unknown words, id -1, as an id no word has
+
+
+def shingle_hashes(ids, size):
+    """Returns array of the hash of each run of size ids, by position"""
+    hashes = array('Q')
+    if len(ids) < size:
+        return hashes
+    top = pow(BASE, size - 1, 1 << 64)
+    h = 0
+    for i in range(size):
+        h = (h * BASE + ids[i] + 1) & MASK
+    hashes.append(h)
+    for i in range(size, len(ids)):
+        h = ((h - (ids[i - size] + 1) * top) * BASE + ids[i] + 1) & MASK
+        hashes.append(h)
+    return hashes
+
+
+class CopyIndex(object):
+    """Shingle index over the words of a corpus"""
+
+    def __init__(self, words, shingle=SHINGLE):
+        self.shingle = shingle
+        self.vocab = Vocabulary()
+        self.ids = array('I', map(self.vocab.intern, words))
+        hashes = shingle_hashes(self.ids, shingle)
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        self.hashes = array('Q', (hashes[i] for i in order))
+        self.positions = array('I', order)
+        i = 0
+        for _, group in groupby(self.hashes):
+            size = sum(1 for _ in group)
+            if size > MAX_CANDIDATES:
+                self.positions[i:i + size] = array('I', sorted(self.positions[i:i + size],
+                                                               key=self._following))
+            i += size
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _following(self, position):
+        """Returns bytes of the ids of the shingle at position and the EXTEND words after it.
+            Ids are all as wide, so the bytes sort word by word, as bisection needs"""
+        return self.ids[position:position + self.shingle + EXTEND].tobytes()
+
+    def _candidates(self, h, ids, start):
+        """Returns array of the positions whose shingle hashes to h, or of a common shingle
+            the two that best match ids from start, see module doc"""
+        lo = bisect_left(self.hashes, h)
+        hi = bisect_right(self.hashes, h, lo)
+        if hi - lo <= MAX_CANDIDATES:
+            return self.positions[lo:hi]
+        following = array('I', (i & ID_MASK for i in ids[start:start + self.shingle + EXTEND]))
+        i = bisect_left(self.positions, following.tobytes(), lo, hi, key=self._following)
+        return self.positions[max(lo, i - 1):min(hi, i + 1)]
+
+    def longest_overlap(self, words):
+        """Returns (length, corpus word position) of the longest run of consecutive words
+            that also occurs in corpus, (0, -1) if none is shingle words or longer"""
+        if isinstance(words, str):
+            words = words.split()
+        ids = [self.vocab.get(word, -1) for word in words]
+        corpus = self.ids
+        best = (0, -1)
+        for start, h in enumerate(shingle_hashes([i & MASK for i in ids], self.shingle)):
+            if len(ids) - start <= best[0]:
+                break           # no longer run can start here
+            if -1 in ids[start:start + self.shingle]:
+                continue
+            for position in self._candidates(h, ids, start):
+                if start + best[0] >= len(ids):
+                    break       # matched the rest of the text
+                end = position + best[0]
+                if best[0] and (end >= len(corpus) or corpus[end] != ids[start + best[0]]):
+                    continue    # cannot be longer than best
+                length = 0
+                while (start + length < len(ids) and position + length < len(corpus)
+                       and corpus[position + length] == ids[start + length]):
+                    length += 1
+                if length > best[0]:
+                    best = (length, position)
+        return best
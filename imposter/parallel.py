@@ -0,0 +1,113 @@
+"""Counts corpus transitions in parallel over byte range shards of the file.
+
+Shard boundaries are moved forward to a whitespace byte so no word is split.
+A shard owns the windows whose first word lies inside it; to complete the
+windows starting near its end, the worker reads order more words past it.
+
+Workers first return the distinct words of their shards, which the parent
+sorts into one vocabulary and hands to every worker. Workers then count their
+windows as integers packing the word ids and send them back sorted, in arrays,
+so only machine integers are pickled and the parent merges sorted runs
+straight into the rows of a TransitionTable.
+"""
+import heapq
+import os
+import re
+from array import array
+from collections import Counter
+from itertools import groupby
+from multiprocessing import Pool
+from operator import itemgetter
+
+from model import TransitionTable, Vocabulary
+
+SHARD_SIZE = 64 << 20       # upper bound on bytes held by a worker at once
+WHITESPACE = re.compile(rb'\s')
+
+_ids = None     # word -> id in the sorted vocabulary, set in each worker by _use_vocabulary
+
+
+def shard_ranges(path, count):
+    """Returns list of (start, end) byte ranges splitting file on whitespace"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, count):
+            position = max(size * i // count, bounds[-1])
+            f.seek(position)
+            while True:
+                chunk = f.read(4096)
+                if not chunk:
+                    position = size
+                    break
+                match = WHITESPACE.search(chunk)
+                if match:
+                    position += match.start()
+                    break
+                position += len(chunk)
+            bounds.append(position)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def shard_words(job):
+    """Returns list of the words in a byte range, followed by size - 1 words past it"""
+    path, start, end, size = job
+    with open(path, 'rb') as f:
+        f.seek(start)
+        words = f.read(end - start).decode('utf-8').split()
+        following = b''
+        while True:
+            chunk = f.read(4096)
+            following += chunk
+            if not chunk or len(following.split()) >= size:
+                break
+        # unless at end of file the last word may be cut off, the first size - 1 are whole
+        words.extend(following.decode('utf-8', errors='ignore').split()[:size - 1])
+    return words
+
+
+def shard_vocabulary(job):
+    return set(shard_words(job))
+
+
+def _use_vocabulary(words):
+    global _ids
+    _ids = {word: i for i, word in enumerate(words)}
+
+
+def count_shard(job):
+    """Returns (windows, counts) of the windows of size words whose first word is in a
+        byte range, windows packing their word ids, sorted. Needs _use_vocabulary first"""
+    path, start, end, size = job
+    ids = [_ids[word] for word in shard_words(job)]
+    bits = max(1, (len(_ids) - 1).bit_length())
+    mask = (1 << bits * size) - 1
+    counts = Counter()
+    window = 0
+    for n, word_id in enumerate(ids):
+        window = ((window << bits) | word_id) & mask
+        if n >= size - 1:
+            counts[window] += 1
+    windows = array('Q') if bits * size <= 64 else []
+    windows.extend(sorted(counts))
+    return windows, array('I', (counts[window] for window in windows))
+
+
+def count_table(path, order=2, processes=None, progress=None):
+    """Returns TransitionTable of every window of order + 1 words in file, counted by a
+        process pool. progress is an optional wrapper for the iterator of finished shards"""
+    processes = processes or os.cpu_count()
+    shards = max(processes * 4, os.path.getsize(path) // SHARD_SIZE + 1)
+    jobs = [(path, start, end, order + 1) for start, end in shard_ranges(path, shards)]
+    words = set()
+    with Pool(processes) as pool:
+        for shard in pool.imap_unordered(shard_vocabulary, jobs):
+            words.update(shard)
+    words = sorted(words)
+    with Pool(processes, _use_vocabulary, (words,)) as pool:
+        results = pool.imap_unordered(count_shard, jobs)
+        runs = [zip(*shard) for shard in (progress(results) if progress else results)]
+    windows = ((window, sum(count for _, count in group))
+               for window, group in groupby(heapq.merge(*runs), key=itemgetter(0)))
+    return TransitionTable.from_sorted(windows, order, Vocabulary(words))
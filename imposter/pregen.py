@@ -0,0 +1,83 @@
+"""Posts generated ahead of time, so the posting loop never waits on the model.
+
+A PostQueue runs a producer thread that drafts posts with Imposter.draft,
+which applies the length, repost and copy checks, into a bounded deque. When
+fewer than low_water posts are left, the producer is woken and refills the
+queue to size. get() pops a ready post in O(1) and records it as posted; it
+only blocks when the queue ran dry.
+"""
+import threading
+from collections import deque
+
+QUEUE_SIZE = 32     # posts kept ready
+LOW_WATER = 8       # posts left when the producer starts refilling
+
+
+class PostQueue(object):
+
+    def __init__(self, bot, size=QUEUE_SIZE, low_water=LOW_WATER, **options):
+        self.bot = bot
+        self.size = size
+        self.low_water = low_water
+        self.options = options      # generate_text arguments, e.g. max_chars
+        self.posts = deque()
+        self.queued = set()         # texts in posts, checked by the producer without a lock
+        self.error = None           # why the producer stopped, raised once posts run out
+        self.closed = False
+        self.changed = threading.Condition()
+        self.thread = threading.Thread(target=self._produce, daemon=True,
+                                       name='pregen-{}'.format(bot.name))
+        self.thread.start()
+
+    def __len__(self):
+        return len(self.posts)
+
+    def _produce(self):
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.closed or len(self.posts) < self.low_water)
+            while len(self.posts) < self.size and not self.closed:
+                try:
+                    post = self.bot.draft(exclude=self.queued, **self.options)
+                except Exception as e:
+                    with self.changed:
+                        self.error = e
+                        self.changed.notify_all()
+                    return
+                with self.changed:
+                    self.posts.append(post)
+                    self.queued.add(post)
+                    self.changed.notify_all()
+            if self.closed:
+                return
+
+    def get(self, timeout=None):
+        """Returns the oldest ready post and records it as posted. Waits up to timeout
+            seconds if none is ready, raising TimeoutError, or the producer's error
+            if it stopped"""
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.posts or self.error or self.closed, timeout):
+                raise TimeoutError('no post generated in {} seconds'.format(timeout))
+            if not self.posts:
+                raise self.error or ValueError('post queue is closed')
+            post = self.posts[0]
+            self.bot.write_result(post)     # before leaving queued, see Imposter.draft
+            self.bot.metrics.count('posts')
+            self.queued.discard(post)
+            self.posts.popleft()
+            if len(self.posts) < self.low_water:
+                self.changed.notify_all()
+        return post
+
+    def close(self):
+        """Stops the producer after the post it is drafting, ready posts are dropped"""
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
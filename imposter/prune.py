@@ -0,0 +1,68 @@
+"""Compaction of a TransitionTable: drops rare transitions and dead ends.
+
+A transition is kept if it occurred at least min_count times and is among
+the top_k most frequent of its state. A dead end is a state that generation
+can reach but never leave, e.g. the last state of the corpus or a state
+whose transitions were all pruned. Removing one can leave its predecessors
+without successors too, so dead ends are removed with a worklist over the
+reverse edges until none are left.
+"""
+from collections import Counter, defaultdict
+
+from model import SLOT_BITS, TransitionTable, pack
+
+
+def _filter(followers, min_count, top_k):
+    kept = {n: c for n, c in followers.items() if c >= min_count}
+    if top_k is not None and len(kept) > top_k:
+        ranked = sorted(kept.items(), key=lambda item: (-item[1], item[0]))
+        kept = dict(ranked[:top_k])
+    return kept
+
+
+def _remove_dead_ends(states):
+    """Removes, in place, transitions into states not in states and states left without any"""
+    predecessors = defaultdict(list)
+    dead = []
+    for state, followers in states.items():
+        for next_id in list(followers):
+            following = state[1:] + (next_id,)
+            if following in states:
+                predecessors[following].append(state)
+            else:
+                del followers[next_id]
+        if not followers:
+            dead.append(state)
+    while dead:
+        state = dead.pop()
+        if state not in states:
+            continue
+        del states[state]
+        for previous in predecessors.pop(state, ()):
+            followers = states.get(previous)
+            if followers and state[-1] in followers:
+                del followers[state[-1]]
+                if not followers:
+                    dead.append(previous)
+
+
+def prune_table(table, min_count=1, top_k=None, drop_dead_ends=True):
+    """Returns a new table over the same vocabulary without transitions seen fewer than
+        min_count times, with at most top_k successors per state, and without dead ends
+        if drop_dead_ends"""
+    states = {}
+    for state, followers in table.id_items():
+        kept = _filter(followers, min_count, top_k)
+        if kept:
+            states[state] = kept
+    if drop_dead_ends:
+        _remove_dead_ends(states)
+
+    counter = Counter()
+    for state, followers in states.items():
+        state_key = pack(state, SLOT_BITS) << SLOT_BITS
+        for next_id, count in followers.items():
+            counter[state_key | next_id] = count
+    pruned = TransitionTable(table.order, table.vocab)
+    pruned._load_counter(counter)
+    return pruned
@@ -0,0 +1,68 @@
+"""Serves many bots from one process.
+
+Bots are loaded from BOTS_DIR when first asked for, as compact models mapped
+from their model files, a bot built on first request being mapped once it is
+saved. Rows and words are paged in from the mapping as generation touches
+them, and personas built from the same files share those pages, so nothing
+is copied onto the Python heap. Interning the words of every bot in one
+shared vocabulary would do just that, so each reads its words from its own
+file. A bot is counted against the memory budget with the size of its
+mapping, all of which can become resident, and what it holds in memory. When
+the loaded bots outgrow the budget, the least recently used ones are dropped;
+they are mapped again on the next request.
+"""
+import os
+from collections import OrderedDict
+
+from config import *
+from corpora import find_corpus
+from markov import Imposter, log
+from modelfile import load_model
+
+
+class ModelRegistry(object):
+
+    def __init__(self, memory_budget=1 << 30, order=2):
+        self.memory_budget = memory_budget      # bytes, approximate
+        self.order = order
+        self.bots = OrderedDict()               # name -> Imposter, least recently used first
+        self.sizes = {}                         # name -> bytes of its mapping and model
+
+    def __contains__(self, name):
+        return name in self.bots
+
+    def __len__(self):
+        return len(self.bots)
+
+    def names(self):
+        """Returns names of bots in BOTS_DIR that can be loaded"""
+        return sorted(name for name in os.listdir(BOTS_DIR)
+                      if find_corpus(os.path.join(BOTS_DIR, name)))
+
+    @property
+    def nbytes(self):
+        return sum(self.sizes.values())
+
+    def get(self, name):
+        """Returns the Imposter for a bot, loading it if needed"""
+        if name in self.bots:
+            self.bots.move_to_end(name)
+            return self.bots[name]
+        corpus = find_corpus(os.path.join(BOTS_DIR, name))
+        if corpus is None:
+            raise KeyError(name)
+        bot = Imposter(corpus, compact=True, order=self.order, name=name)
+        if getattr(bot.model, 'buffer', None) is None:
+            bot.model = load_model(bot.model_file)      # built and saved just now
+            bot._reset_indexes()
+        self.bots[name] = bot
+        self.sizes[name] = len(bot.model.buffer) + bot.model.nbytes
+        self.evict()
+        return bot
+
+    def evict(self):
+        """Drops least recently used bots until within memory budget, keeping at least one"""
+        while len(self.bots) > 1 and self.nbytes > self.memory_budget:
+            name, bot = self.bots.popitem(last=False)
+            del self.sizes[name]
+            log.info('evicting %s', name)
@@ -0,0 +1,160 @@
+"""Random choice of seed states for generation.
+
+Legacy caches get a SeedIndex, an alias table drawing states in constant time.
+A TransitionTable already holds running totals of its counts, and model files
+hold those of its sentence starts, so ModelSeeds draws from a table by bisecting
+them and builds nothing over its rows; workers mapping one model file share
+them too. States changed by update() since the rows were laid out are drawn
+from a small alias table of their own, and draws of their old rows are redone.
+"""
+import random
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+
+class AliasTable(object):
+    """Draws index i with probability weights[i] / sum(weights) in O(1), using
+        Vose's alias method. Building the table is O(n)"""
+
+    def __init__(self, weights):
+        n = len(weights)
+        if not n:
+            raise ValueError('no weights to draw from')
+        total = float(sum(weights)) or 1.0
+        scaled = [w * n / total for w in weights]
+        self.prob = array('d', [1.0]) * n
+        self.alias = array('I', range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self):
+        i = int(random.random() * len(self.prob))
+        return i if random.random() < self.prob[i] else self.alias[i]
+
+
+class SeedIndex(object):
+    """Weighted set of states to start generating from"""
+
+    def __init__(self, states, weights):
+        self.states = states
+        self.table = AliasTable(weights)
+
+    def __len__(self):
+        return len(self.states)
+
+    def sample(self):
+        return self.states[self.table.sample()]
+
+
+def cache_seed_index(cache, sentence_start=False):
+    """Builds a SeedIndex of states of a legacy cache dict. States are weighted by how often
+        they occur, or with sentence_start by how often they follow a word ending in .?!,
+        if any do. Raises ValueError if cache is empty"""
+    if not sentence_start:
+        states = list(cache)
+        return SeedIndex(states, [len(cache[s]) for s in states])
+    weights = {}
+    for state, followers in cache.items():
+        if state[0][-1] in '.?!':
+            for word in followers:
+                start = state[1:] + (word,)
+                if start in cache:
+                    weights[start] = weights.get(start, 0) + 1
+    if not weights:
+        return cache_seed_index(cache)      # corpus without sentence ends
+    return SeedIndex(list(weights), list(weights.values()))
+
+
+class ModelSeeds(object):
+    """Weighted states of a TransitionTable to start generating from. changed() must be
+        called after the table's update(), and a new index made after its freeze()"""
+
+    def __init__(self, table, sentence_start=False):
+        self.table = table
+        self.sentence_start = sentence_start and len(table.sentence_starts()[0]) > 0
+        if self.sentence_start:
+            self.rows, self.totals = table.sentence_starts()
+        else:
+            self.rows, self.totals = None, table.sampler.cumulative     # rows by transitions
+        self.total = self.totals[-1] if len(self.totals) else 0
+        self.added = None       # (states, AliasTable, total) of changed states
+        self.replaced = set()   # rows of changed states, drawn again when picked
+        self.kept = self.total  # total weight of the other rows
+        self._overlay()
+
+    def changed(self):
+        self.added = None
+
+    def _weight(self, row):
+        """Returns weight of a row in the laid out table, 0 if it is no seed"""
+        if self.rows is None:
+            return self.table.sampler.bounds(row)[3]
+        i = bisect_left(self.rows, row)
+        if i < len(self.rows) and self.rows[i] == row:
+            return self.totals[i] - (self.totals[i - 1] if i else 0)
+        return 0
+
+    def _changes(self):
+        """Returns Counter of the weight states gain or lose by the changes of update()"""
+        table, changes = self.table, Counter()
+        for ids, followers in table.delta.items():
+            row = table.find_ids(ids)
+            if not self.sentence_start:
+                changes[ids] += sum(followers.values()) - (self._weight(row) if row >= 0 else 0)
+                continue
+            changes[ids] += 0       # a state that lost every successor is no seed
+            if table.vocab[ids[0]][-1] in '.?!':
+                before = table.row_ids(row) if row >= 0 else {}
+                for next_id in set(before) | set(followers):
+                    changes[ids[1:] + (next_id,)] += followers.get(next_id, 0) - before.get(next_id, 0)
+        return changes
+
+    def _overlay(self):
+        table, delta = self.table, self.table.delta
+        self.replaced, self.kept = set(), self.total
+        weights = {}
+        for ids, change in self._changes().items():
+            row = table.find_ids(ids)
+            weight = change
+            if row >= 0:
+                base = self._weight(row)
+                self.replaced.add(row)
+                self.kept -= base
+                weight += base
+            alive = bool(delta[ids]) if ids in delta else row >= 0
+            if alive and weight > 0:
+                weights[ids] = weight
+        states = list(weights)
+        aliases = AliasTable([weights[ids] for ids in states]) if states else None
+        self.added = states, aliases, sum(weights.values())
+        if not self.kept + self.added[2]:
+            raise ValueError('no states to draw seeds from')
+
+    def _draw_row(self):
+        i = bisect_right(self.totals, int(random.random() * self.total))
+        if self.rows is None:
+            return bisect_right(self.table.offsets, i) - 1
+        return self.rows[i]
+
+    def sample(self):
+        """Returns a random state as a tuple of words"""
+        if self.added is None:
+            self._overlay()
+        states, aliases, added = self.added
+        if random.random() * (self.kept + added) < added:
+            return tuple(self.table.vocab[i] for i in states[aliases.sample()])
+        while True:
+            row = self._draw_row()
+            if row not in self.replaced:
+                return self.table.row_state(row)
+
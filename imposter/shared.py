@@ -0,0 +1,61 @@
+"""Publishes a binary model in shared memory, for generation worker processes.
+
+publish_model() copies a model file once into a multiprocessing.shared_memory
+segment. Workers pass its name to attach_model() and get a TransitionTable
+reading the segment through modelfile.open_buffer, read-only and without a
+copy, so every worker uses the same physical pages and attaching costs only
+parsing the header. Seeds are drawn from the running totals in the file too,
+so workers build no seed tables of their own. A bot opened with
+Imposter(shared=name) is read-only: its directory, corpus and results belong
+to the publishing bot, so it does not store or link the corpus, can not add
+to it or save, and keeps the results it writes in memory for the publisher
+to record. The publisher owns the segment and removes it with close().
+"""
+import mmap
+import os
+from multiprocessing import shared_memory
+
+from modelfile import open_buffer
+
+
+class SharedModel(object):
+    """Shared memory segment holding a model file, removed when closed"""
+
+    def __init__(self, path, name=None):
+        size = os.path.getsize(path)
+        self.segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        with open(path, 'rb') as f:
+            f.readinto(self.segment.buf[:size])
+        self.size = size
+
+    @property
+    def name(self):
+        return self.segment.name
+
+    def close(self):
+        self.segment.close()
+        self.segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def publish_model(path, name=None):
+    """Copies the model file at path into a new shared memory segment"""
+    return SharedModel(path, name)
+
+
+def attach_model(name):
+    """Returns a TransitionTable over the model published as name, mapped read-only.
+        The mapping is not registered with the multiprocessing resource tracker, which
+        would remove the segment when this worker exits"""
+    import _posixshmem      # POSIX only, and only needed by workers
+    fd = _posixshmem.shm_open('/' + name.lstrip('/'), os.O_RDONLY, mode=0o600)
+    try:
+        mapping = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+    return open_buffer(mapping)
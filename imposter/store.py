@@ -0,0 +1,241 @@
+"""Transition counts kept in SQLite, for models that do not fit in memory.
+
+Transitions live in a WITHOUT ROWID table whose primary key is (state, next),
+so the rows of one state are stored together in the B-tree and a lookup is
+one index seek. States are their words joined by spaces, which words never
+contain. Successors of recently used states are kept in an LRU of
+running totals, sampled like TransitionTable rows.
+
+Seeding draws from a table of running totals of state weights, one for all
+states and one for sentence starts, by seeking the first total above a
+random number. It is rebuilt by index_seeds() when the store is saved, so
+states added by update() since are not drawn as seeds until then.
+
+One connection serves every thread, such as a PostQueue producer drafting
+while the owner ingests. Its statements and the LRU are guarded by a lock.
+"""
+import os
+import random
+import sqlite3
+import sys
+import threading
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from itertools import accumulate, islice
+
+HOT_STATES = 100000     # states whose successors are cached in memory
+INSERT_BATCH = 1 << 18  # windows counted in memory before they are written
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS transitions (
+    state TEXT NOT NULL,
+    next TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (state, next)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seeds (
+    kind INTEGER NOT NULL,          -- 0 for all states, 1 for sentence starts
+    cumulative INTEGER NOT NULL,    -- running total of weights up to this state
+    state TEXT NOT NULL,
+    PRIMARY KEY (kind, cumulative)
+) WITHOUT ROWID;
+"""
+
+UPSERT = """
+INSERT INTO transitions (state, next, count) VALUES (?, ?, ?)
+ON CONFLICT (state, next) DO UPDATE SET count = count + excluded.count
+"""
+
+
+class SQLiteStore(object):
+
+    def __init__(self, path, order=2, hot_states=HOT_STATES):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()   # guards db and hot across threads
+        self.db.executescript(SCHEMA)
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'order'").fetchone()
+        if row is None:
+            self.db.execute("INSERT INTO meta VALUES ('order', ?)", (order,))
+        self.order = row[0] if row else order
+        self.hot_states = hot_states
+        self.hot = OrderedDict()    # state -> (next words, running totals of counts)
+        self.delta = {}             # always empty, changes go straight to the database
+        self._size = None
+
+    @classmethod
+    def from_windows(cls, path, windows, order=2, hot_states=HOT_STATES):
+        """Builds a store at path, replacing any there, from word tuples of length order + 1.
+            They are counted in batches of INSERT_BATCH so memory does not grow with corpus"""
+        if os.path.isfile(path):
+            os.remove(path)
+        store = cls(path, order, hot_states)
+        windows = iter(windows)
+        while True:
+            counts = Counter(islice(windows, INSERT_BATCH))
+            if not counts:
+                break
+            store.db.executemany(UPSERT, ((' '.join(w[:-1]), w[-1], c) for w, c in counts.items()))
+        store.commit()
+        return store
+
+    def commit(self):
+        with self.lock:
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def _query(self, sql, parameters=()):
+        """Returns all rows of a statement"""
+        with self.lock:
+            return self.db.execute(sql, parameters).fetchall()
+
+    def __len__(self):
+        if self._size is None:
+            self._size = self._query(
+                'SELECT COUNT(*) FROM (SELECT DISTINCT state FROM transitions)')[0][0]
+        return self._size
+
+    def __contains__(self, state):
+        try:
+            self._followers(state)
+            return True
+        except KeyError:
+            return False
+
+    @property
+    def transition_count(self):
+        return self._query('SELECT COUNT(*) FROM transitions')[0][0]
+
+    @property
+    def vocabulary_size(self):
+        """Number of distinct words that follow a state"""
+        return self._query('SELECT COUNT(DISTINCT next) FROM transitions')[0][0]
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the hot states"""
+        with self.lock:
+            size = sys.getsizeof(self.hot)
+            for words, totals in self.hot.values():
+                size += sys.getsizeof(words) + sys.getsizeof(totals)
+        return size
+
+    def _followers(self, state):
+        """Returns (next words, running totals) of state, raises KeyError if it has none"""
+        key = ' '.join(state)
+        with self.lock:
+            entry = self.hot.get(key)
+            if entry is not None:
+                self.hot.move_to_end(key)
+                return entry
+            rows = self.db.execute('SELECT next, count FROM transitions WHERE state = ?',
+                                   (key,)).fetchall()
+            if not rows:
+                raise KeyError(state)
+            entry = [word for word, _ in rows], list(accumulate(count for _, count in rows))
+            self.hot[key] = entry
+            if len(self.hot) > self.hot_states:
+                self.hot.popitem(last=False)
+        return entry
+
+    def successors(self, state):
+        words, totals = self._followers(state)
+        return {w: t - (totals[i - 1] if i else 0) for i, (w, t) in enumerate(zip(words, totals))}
+
+    def choose(self, state):
+        """Picks next word for state with probability proportional to its count"""
+        words, totals = self._followers(state)
+        return words[bisect_right(totals, int(random.random() * totals[-1]))]
+
+    def choose_many(self, state, k):
+        words, totals = self._followers(state)
+        return random.choices(words, cum_weights=totals, k=k)
+
+    def update(self, windows):
+        """Merges a Counter of windows into the store, negative counts remove occurrences"""
+        rows = [(' '.join(w[:-1]), w[-1], c) for w, c in windows.items()]
+        with self.lock:
+            self.db.executemany(UPSERT, rows)
+            self.db.executemany(
+                'DELETE FROM transitions WHERE state = ? AND next = ? AND count <= 0',
+                [(state, word) for state, word, count in rows if count < 0])
+            for state, _, _ in rows:
+                self.hot.pop(state, None)
+            self._size = None
+
+    def freeze(self):
+        pass
+
+    def items(self):
+        """Yields (state, {next_word: count}) of every state, in state order"""
+        with self.lock:
+            cursor = self.db.execute(
+                'SELECT state, next, count FROM transitions ORDER BY state, next')
+        state, followers = None, {}
+        for key, word, count in self._fetch(cursor):
+            if key != state:
+                if followers:
+                    yield tuple(state.split(' ')), followers
+                state, followers = key, {}
+            followers[word] = count
+        if followers:
+            yield tuple(state.split(' ')), followers
+
+    def _fetch(self, cursor, size=INSERT_BATCH):
+        """Yields rows of cursor, fetched in batches under the lock"""
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(size)
+            if not rows:
+                return
+            yield from rows
+
+    def to_cache(self):
+        """Expands the store into the legacy cache dict format"""
+        return {state: [w for w, c in followers.items() for _ in range(c)]
+                for state, followers in self.items()}
+
+    def index_seeds(self):
+        """Rebuilds running totals of state weights: how often each state occurs, and how
+            often it follows a word ending in .?!"""
+        with self.lock:
+            db = self.db
+            db.execute('DELETE FROM seeds')
+            db.execute("""
+                INSERT INTO seeds (kind, cumulative, state)
+                SELECT 0, SUM(total) OVER (ORDER BY state), state
+                FROM (SELECT state, SUM(count) AS total FROM transitions GROUP BY state)""")
+            # a window (end, w1 ... wn) makes (w1 ... wn) start a sentence
+            db.execute("""
+                INSERT INTO seeds (kind, cumulative, state)
+                SELECT 1, SUM(total) OVER (ORDER BY start), start FROM (
+                    SELECT start, SUM(count) AS total FROM (
+                        SELECT CASE WHEN rest = '' THEN next ELSE rest || ' ' || next END AS start,
+                               count
+                        FROM (SELECT substr(state, instr(state || ' ', ' ') + 1) AS rest,
+                                     substr(state, instr(state || ' ', ' ') - 1, 1) AS ending,
+                                     next, count
+                              FROM transitions)
+                        WHERE ending IN ('.', '?', '!'))
+                    WHERE start IN (SELECT state FROM transitions)
+                    GROUP BY start)""")
+            db.commit()
+
+    def sample_state(self, sentence_start=False):
+        """Returns a random state weighted by how often it occurs, or with sentence_start
+            how often it starts a sentence. Falls back to all states if none start one"""
+        kind = 1 if sentence_start else 0
+        total = self._query('SELECT MAX(cumulative) FROM seeds WHERE kind = ?', (kind,))[0][0]
+        if not total:
+            if sentence_start:
+                return self.sample_state()
+            raise KeyError('store has no seed states')
+        target = int(random.random() * total)
+        state = self._query(
+            'SELECT state FROM seeds WHERE kind = ? AND cumulative > ? ORDER BY cumulative LIMIT 1',
+            (kind, target))[0][0]
+        return tuple(state.split(' '))
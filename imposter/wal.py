@@ -0,0 +1,75 @@
+"""Append-only log of transition count changes made since the last snapshot.
+
+The snapshot is the saved cache.json or model.bin. Each change, a dict of
+{window: count}, is appended as one record framed by its length and CRC32,
+so a record torn by a crash is detected and cut off when the log is replayed.
+The log starts with the size and mtime of the snapshot it applies to. A new
+snapshot has a different mtime, so a log left behind by a crash between
+writing a snapshot and clearing the log is recognized and dropped instead of
+being applied twice.
+"""
+import json
+import os
+import struct
+import zlib
+
+MAGIC = b'IMPWAL1\0'
+HEADER = struct.Struct('<8sQQ')     # magic, snapshot size, snapshot mtime in ns
+FRAME = struct.Struct('<II')        # payload length, crc32 of payload
+
+
+def _identity(path):
+    info = os.stat(path)
+    return info.st_size, info.st_mtime_ns
+
+
+class TransitionLog(object):
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync        # fsync each record, so it survives a power loss
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+    def append(self, delta, snapshot):
+        """Appends {window: count} to the log of changes on top of the snapshot file"""
+        payload = json.dumps([list(window) + [count] for window, count in delta.items()])
+        payload = payload.encode('utf-8')
+        with open(self.path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(HEADER.pack(MAGIC, *_identity(snapshot)))
+            f.write(FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+
+    def replay(self, snapshot):
+        """Yields every complete change logged on top of the snapshot file. A log written
+            for another snapshot is removed, and a torn last record is truncated"""
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, 'r+b') as f:
+            header = f.read(HEADER.size)
+            current = (len(header) == HEADER.size and os.path.isfile(snapshot)
+                       and HEADER.unpack(header) == (MAGIC,) + _identity(snapshot))
+            good = f.tell()
+            while current:
+                frame = f.read(FRAME.size)
+                if len(frame) < FRAME.size:
+                    break
+                length, crc = FRAME.unpack(frame)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                good = f.tell()
+                yield {tuple(entry[:-1]): entry[-1] for entry in json.loads(payload.decode('utf-8'))}
+            if current and good < f.seek(0, os.SEEK_END):
+                f.truncate(good)
+        if not current:
+            self.clear()
+
+    def clear(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,44 @@
+from collections import Counter
+
+import numpy as np
+
+from imposter.config import *
+from imposter.model import TransitionTable
+from imposter.batch import BatchGenerator
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestBatchGenerator:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            words = f.read().split()
+        self.windows = set(zip(words, words[1:], words[2:]))
+        self.table = TransitionTable.from_windows(zip(words, words[1:], words[2:]))
+        self.generator = BatchGenerator(self.table)
+        np.random.seed(0)
+
+    def test_chains_follow_transitions(self):
+        rows = np.arange(len(self.table))
+        for text in self.generator.generate_text(rows, size=40, min_size=5):
+            words = text.split()
+            for window in zip(words, words[1:], words[2:]):
+                assert window in self.windows
+
+    def test_chains_stop_at_sentence_end(self):
+        rows = np.arange(len(self.table))
+        for chain in self.generator.generate_text(rows, size=40, min_size=3):
+            words = chain.split()
+            assert len(words) <= 40
+            for i, word in enumerate(words[:-1]):
+                assert not (word[-1] in '.?!' and i > 3)
+
+    def test_advance_distribution(self):
+        state = ('will', 'be')
+        row = self.table.find(state)
+        picks = Counter(self.generator.advance(np.full(10000, row)).tolist())
+        followers = self.table.successors(state)
+        total = sum(followers.values())
+        for word, count in followers.items():
+            assert abs(picks[self.table.vocab.get(word)] / 10000 - count / total) < 0.03
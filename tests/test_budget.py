@@ -0,0 +1,52 @@
+import random
+from collections import Counter
+
+from imposter.budget import UNREACHABLE, LengthIndex
+from imposter.config import *
+from imposter.model import TransitionTable
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestLengthIndex:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            words = f.read().split()
+        self.table = TransitionTable.from_windows(zip(words, words[1:], words[2:]))
+        self.index = LengthIndex(self.table)
+
+    def row(self, *state):
+        return self.table.find(state)
+
+    def test_small_graph(self):
+        # from (a, b) the text ends either as "a b c." or as "a b dd x y."
+        counts = Counter({('a', 'b', 'c.'): 1, ('b', 'c.', 'z'): 1, ('c.', 'z', 'q'): 1,
+                          ('a', 'b', 'dd'): 3, ('b', 'dd', 'x'): 1, ('dd', 'x', 'y.'): 1,
+                          ('x', 'y.', 'q'): 1, ('y.', 'q', 'q'): 1, ('q', 'q', 'q'): 1,
+                          ('z', 'q', 'q'): 1})
+        table = TransitionTable.from_counts(counts)
+        index = LengthIndex(table)
+        row = table.find(('a', 'b'))
+        assert index.min_words[row] == 3
+        assert index.min_chars[row] == len('a b c.')
+        assert abs(index.expected_words[row] - (0.25 * 3 + 0.75 * 5)) < 1e-9
+        assert abs(index.expected_chars[row] - (0.25 * 6 + 0.75 * len('a b dd x y.'))) < 1e-9
+        assert index.min_chars[table.find(('q', 'q'))] == UNREACHABLE
+
+    def test_min_chars_matches_walks(self):
+        for row in range(len(self.table.keys)):
+            m = self.index.min_chars[row]
+            if m == UNREACHABLE:
+                continue
+            words = self.index.walk(row, m)
+            text = ' '.join(self.table.vocab[i] for i in words)
+            assert len(text) == m and text[-1] in '.?!'
+
+    def test_walk_ends_within_budget(self):
+        random.seed(3)
+        rows = [r for r in range(len(self.table.keys)) if self.index.min_chars[r] <= 60]
+        for row in rows:
+            words = self.index.walk(row, 60, min_words=8)
+            text = ' '.join(self.table.vocab[i] for i in words)
+            assert len(text) <= 60 and text[-1] in '.?!'
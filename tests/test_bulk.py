@@ -0,0 +1,36 @@
+import shutil
+import tempfile
+
+from imposter.bulk import build_all, discover
+from imposter.config import *
+from imposter.corpora import remove_bot
+
+CORPORA = {'bulk_small.txt': 'tst_new_body.txt', 'bulk_large.txt': 'testing.txt'}
+
+
+class TestBulk:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        for name, source in CORPORA.items():
+            shutil.copyfile(os.path.join(CORPUS_FILES_DIR, source), os.path.join(self.dir, name))
+        os.makedirs(os.path.join(self.dir, 'nested.txt'))    # not a corpus
+        open(os.path.join(self.dir, 'notes.md'), 'w').close()
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.dir)
+        for name in CORPORA:
+            remove_bot(os.path.join(BOTS_DIR, name[:-4]))
+
+    def test_discover_largest_first(self):
+        corpora = discover([self.dir, os.path.join(self.dir, 'missing')])
+        assert [os.path.basename(path) for path, _ in corpora] == ['bulk_large.txt',
+                                                                   'bulk_small.txt']
+        assert corpora[0][1] > corpora[1][1]
+
+    def test_build_all(self):
+        results = build_all(discover([self.dir]), processes=2, compact=True)
+        assert sorted(r['name'] for r in results) == ['bulk_large', 'bulk_small']
+        assert not any(r['error'] for r in results)
+        for name in CORPORA:
+            assert os.path.isfile(os.path.join(BOTS_DIR, name[:-4], 'model.bin'))
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+
+from imposter.config import *
+from imposter.corpora import collect, find_corpus, link, remove_bot, store, unshare
+from imposter.corpus import iter_words
+from imposter.fingerprint import file_hash
+from imposter.markov import Imposter
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestCorpora:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.dir, 'store')
+        self.bots = [os.path.join(self.dir, name) for name in ('one', 'two')]
+        for bot_dir in self.bots:
+            os.makedirs(bot_dir)
+        self.sha1 = file_hash(CORPUS)
+        with open(CORPUS) as f:
+            self.words = f.read().split()
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.dir)
+
+    def test_bots_share_stored_corpus(self):
+        paths = [link(store(CORPUS, self.sha1, store_dir=self.store_dir), bot_dir)
+                 for bot_dir in self.bots]
+        assert os.listdir(self.store_dir) == [self.sha1]
+        assert os.path.samefile(*paths)
+        assert list(iter_words(paths[0])) == self.words
+
+        private = unshare(paths[0])
+        assert private == paths[0] and not os.path.samefile(*paths)
+        with open(private, 'a') as f:
+            f.write(' more words')
+        assert list(iter_words(paths[1])) == self.words
+        assert unshare(private) == private
+
+    def test_compressed(self):
+        stored = store(CORPUS, self.sha1, 'gzip', store_dir=self.store_dir)
+        assert stored.endswith('.gz') and os.path.getsize(stored) < os.path.getsize(CORPUS)
+        path = link(stored, self.bots[0])
+        assert find_corpus(self.bots[0]) == path
+        assert list(iter_words(path)) == self.words
+        plain = unshare(path)
+        assert find_corpus(self.bots[0]) == plain and not os.path.isfile(path)
+        assert list(iter_words(plain)) == self.words
+
+    def test_collect(self):
+        for compression in (None, 'gzip'):
+            stored = store(CORPUS, self.sha1, compression, store_dir=self.store_dir)
+        link(stored, self.bots[0])
+        assert collect(self.store_dir, self.dir) == os.path.getsize(CORPUS)
+        assert os.listdir(self.store_dir) == [self.sha1 + '.gz']
+
+    def test_remove_bot(self):
+        stored = store(CORPUS, self.sha1, store_dir=self.store_dir)
+        for bot in self.bots:
+            link(stored, bot)
+        assert remove_bot(self.bots[0], self.store_dir) == 0     # still linked from the other
+        assert not os.path.isdir(self.bots[0]) and os.path.isfile(stored)
+        assert remove_bot(self.bots[1], self.store_dir) == os.path.getsize(CORPUS)
+        assert os.listdir(self.store_dir) == []
+
+    def test_compressed_bot(self):
+        try:
+            bot = Imposter(CORPUS, name='testing_gzip', compression='gzip')
+            bot_stored = os.path.join(CORPUS_STORE_DIR, bot.source['sha1'] + '.gz')
+            assert bot.corpus_file.endswith('corpus.txt.gz')
+            assert bot.word_count == len(self.words)
+            bot.add_to_corpus('a few more words')
+            assert bot.corpus_file.endswith('corpus.txt')
+            assert bot.cache[('few', 'more')] == ['words']
+        finally:
+            remove_bot(os.path.join(BOTS_DIR, 'testing_gzip'))
+        assert not os.path.isfile(bot_stored)
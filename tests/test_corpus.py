@@ -0,0 +1,23 @@
+from imposter.config import *
+from imposter.corpus import iter_windows, iter_words
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestCorpus:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            self.words = f.read().split()
+
+    def test_words_across_chunks(self):
+        for chunk_size in (1, 3, 7, 64, 1 << 20):
+            assert list(iter_words(CORPUS, chunk_size)) == self.words
+
+    def test_windows(self):
+        for size in (1, 3, 6):
+            expected = list(zip(*(self.words[i:] for i in range(size))))
+            assert list(iter_windows(iter_words(CORPUS, 5), size)) == expected
+
+    def test_window_longer_than_words(self):
+        assert list(iter_windows(['a', 'b'], 3)) == []
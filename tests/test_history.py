@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+from imposter.history import ResultLog
+
+
+class TestResultLog:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'results.txt')
+        self.index_path = os.path.join(self.dir, 'results.idx')
+
+    def teardown_method(self, method):
+        for name in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def test_batched_writes(self):
+        log = ResultLog(self.path, self.index_path, batch=3)
+        log.extend(['one post', 'two posts'])
+        assert not os.path.isfile(self.path)
+        log.append('three posts')
+        with open(self.path) as f:
+            assert f.read() == 'one post\n\ntwo posts\n\nthree posts\n\n'
+        log.append('four')
+        log.flush()
+        with open(self.path) as f:
+            assert f.read().endswith('three posts\n\nfour\n\n')
+
+    def test_index_persists(self):
+        log = ResultLog(self.path, self.index_path)
+        log.extend(['a post.', 'a post.', 'another post'])
+        del log     # pending results are written when the log is collected
+        log = ResultLog(self.path, self.index_path)
+        assert len(log) == 2
+        assert 'A  post.' in log
+        assert 'new post' not in log
+        assert os.path.getsize(self.index_path) == 16
+
+    def test_indexes_results_written_before(self):
+        with open(self.path, 'w') as f:
+            f.write('old post\n\nolder post\n\n')
+        log = ResultLog(self.path, self.index_path)
+        assert 'old post' in log and 'older post' in log
+        assert os.path.getsize(self.index_path) == 16
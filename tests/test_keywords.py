@@ -0,0 +1,24 @@
+from imposter.keywords import KeywordIndex, normalize
+from imposter.model import TransitionTable
+
+WORDS = 'the cat sat. the Cat, ran off. a dog sat on the cat. the dog ran off.'.split()
+
+
+class TestKeywordIndex:
+
+    def setup_method(self, method):
+        table = TransitionTable.from_windows(zip(WORDS, WORDS[1:], WORDS[2:]))
+        self.index = KeywordIndex(table.items())
+
+    def test_states_containing_word(self):
+        assert normalize('Cat,') == 'cat'
+        assert 'CAT' in self.index and 'bird' not in self.index
+        states = {self.index.sample_state('cat') for _ in range(200)}
+        assert states == {('the', 'cat'), ('cat', 'sat.'), ('the', 'Cat,'), ('Cat,', 'ran'),
+                          ('the', 'cat.'), ('cat.', 'the')}
+
+    def test_reverse_transitions(self):
+        assert self.index.previous[('ran', 'off.')] == (['Cat,', 'dog'], [1, 2])
+        assert self.index.grow_backward(('sat', 'on'), 10) == ['a', 'dog']  # stops at off.
+        assert self.index.grow_backward(('cat', 'sat.'), 10) == ['the']     # start of corpus
+        assert self.index.grow_backward(('sat', 'on'), 1) == ['dog']
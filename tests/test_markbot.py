@@ -1,8 +1,12 @@
 import itertools
 import random
+import threading
 
+from imposter import markov
 from imposter.config import *
 from imposter.markov import Imposter
+from imposter.metrics import Metrics
+from imposter.pregen import PostQueue
 
 CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
 CACHE_FILE = os.path.join(BOTS_DIR, 'testing/cache.json')
@@ -21,6 +25,12 @@ class TestMarkBot:
         os.remove(CACHE_FILE)
         assert not self.cache_file_exists()
         self.b.cache = {}
+        if os.path.isfile(self.b.fingerprint_file):
+            os.remove(self.b.fingerprint_file)   # next setup copies a fresh corpus
+        self.b.flush_results()
+        for path in (self.b.result_file, self.b.history_file):
+            if os.path.isfile(path):
+                os.remove(path)
 
 
     def cache_file_exists(self):
@@ -216,6 +226,256 @@ class TestMarkBot:
             with open(self.b.corpus_file, 'w') as f:
                 f.writelines(rewrites)
 
+    def corpus_windows(self):
+        with open(self.b.corpus_file, 'r') as f:
+            words = f.read().split()
+        cache = {}
+        for state in zip(words, words[1:], words[2:]):
+            cache.setdefault(state[:2], []).append(state[2])
+        return cache
+
+    def test_add_to_corpus_updates_cache_incrementally(self):
+        self.b.cache = {}
+        self.b.cache.update(self.corpus_windows())
+        self.b._save_cache()
+        self.b.add_to_corpus('There was no willy wonka in the hypodermic chamber')
+        self.b.add_to_corpus(NEW_CORP)
+        expected = self.corpus_windows()
+        assert self.b.cache.keys() == expected.keys()
+        for key, followers in expected.items():
+            assert sorted(self.b.cache[key]) == sorted(followers)
+
+        # saved cache plus delta file reproduce the updated cache
+        updated = self.b.cache
+        self.b.cache = {}
+        self.b.load_saved_cache()
+        self.b._replay_delta()
+        assert self.b.cache.keys() == updated.keys()
+
+        # so does a new bot, without saving the cache again
+        cache_mtime = os.stat(CACHE_FILE).st_mtime_ns
+        b = Imposter(CORPUS)
+        assert b.cache.keys() == updated.keys()
+        assert os.stat(CACHE_FILE).st_mtime_ns == cache_mtime
+
+    def test_seeds_include_added_states(self):
+        try:
+            for bot in (self.b, Imposter(CORPUS, compact=True)):
+                bot.select_seed()       # index built before the text is added
+                bot.add_to_corpus('zebra quagga okapi zorilla.')
+                random.seed(3)
+                seeds = {bot.select_seed() for _ in range(2000)}
+                assert ('zebra', 'quagga') in seeds
+        finally:
+            with open(self.b.corpus_file, 'r') as f:
+                rewrites = [line for line in f if 'zebra' not in line]
+            with open(self.b.corpus_file, 'w') as f:
+                f.writelines(rewrites)
+            for path in (bot.model_file, bot.delta_file):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def test_compact_ingest_keeps_rows(self):
+        bot = Imposter(CORPUS, compact=True)
+        freeze_states = markov.FREEZE_STATES
+        try:
+            indexes = bot.length_index(), bot.seed_index()
+            bot.generate_batch(2, min_size=0)
+            bot.add_to_corpus('zebra quagga okapi zorilla.')
+            random.seed(3)
+            assert ('zebra', 'quagga') in {bot.select_seed() for _ in range(2000)}
+            assert bot.generate_batch(2, min_size=0)
+            assert bot.model.delta      # not laid out again for a few changed states
+            assert (bot.length_index(), bot.seed_index()) == indexes
+
+            markov.FREEZE_STATES = 0
+            bot.add_to_corpus('zebra quagga okapi zorilla.')
+            assert not bot.model.delta and bot.length_index() is not indexes[0]
+            assert bot.model.successors(('zebra', 'quagga')) == {'okapi': 2}
+        finally:
+            markov.FREEZE_STATES = freeze_states
+            with open(bot.corpus_file, 'r') as f:
+                rewrites = [line for line in f if 'zebra' not in line]
+            with open(bot.corpus_file, 'w') as f:
+                f.writelines(rewrites)
+            for path in (bot.model_file, bot.delta_file):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def test_unchanged_source_skips_copy_and_save(self):
+        cache_mtime = os.stat(CACHE_FILE).st_mtime_ns
+        corpus_mtime = os.stat(self.b.corpus_file).st_mtime_ns
+        b = Imposter(CORPUS)
+        assert not b.source_changed
+        assert os.stat(CACHE_FILE).st_mtime_ns == cache_mtime
+        assert os.stat(b.corpus_file).st_mtime_ns == corpus_mtime
+        assert b.cache == self.b.cache
+
+    def test_stats(self):
+        self.b.metrics = Metrics()
+        self.b._rebuild_cache()
+        random.seed(1)      # avoid the dead end state at the end of corpus
+        self.b.generate_text(size=5, min_size=0)
+        stats = self.b.stats()
+        assert stats['model']['states'] == len(self.b.cache)
+        assert stats['model']['transitions'] == sum(len(set(v)) for v in self.b.cache.values())
+        assert stats['counters']['words_read'] == self.b.word_count
+        assert stats['counters']['posts'] == 1
+        for name in ('corpus_read', 'extract', 'build', 'save', 'generate'):
+            assert stats['timers'][name]['calls'] >= 1
+
+    def test_prune_saves_smaller_cache(self):
+        self.b._rebuild_cache()
+        report = self.b.prune(top_k=1)
+        assert report['after']['states'] == len(self.b.cache) < report['before']['states']
+        assert report['after']['file_bytes'] < report['before']['file_bytes']
+        assert all(len(set(v)) == 1 for v in self.b.cache.values())
+        self.b.cache = {}
+        self.b.load_saved_cache()
+        assert len(self.b.cache) == report['after']['states']
+
+    def test_generate_text_within_budget(self):
+        self.b._rebuild_cache()
+        for _ in range(20):
+            text = self.b.generate_text(min_size=0, max_chars=80)
+            assert len(text) <= 80 and text[-1] in '.?!'
+
+    def test_generate_text_rejects_copies(self):
+        self.b._rebuild_cache()
+        text = self.b.generate_text(size=10, min_size=2)
+        assert self.b.longest_overlap(text) >= 2    # testing corpus has few branches
+        written = len(self.b.history)
+        self.b.max_overlap = 1
+        self.b._copies = None
+        try:
+            self.b.generate_text(size=10, min_size=2)
+            assert False
+        except ValueError:
+            pass
+        assert self.b.metrics.counters['copies_rejected'] == 20
+        assert len(self.b.history) == written     # rejected texts not saved
+
+    def test_unique_skips_repeated_texts(self):
+        self.b._rebuild_cache()
+        self.b.unique = True
+        texts = []
+        try:
+            for _ in range(50):
+                texts.append(self.b.generate_text(size=4, min_size=0))
+        except ValueError:
+            pass    # testing corpus has few distinct texts
+        assert len(set(texts)) == len(texts) > 1
+
+    def test_disk_store(self):
+        try:
+            b = Imposter(CORPUS, disk=True)
+            assert b.stats()['model']['states'] == len(self.corpus_windows())
+            random.seed(1)
+            assert b.generate_text(size=5, min_size=0)
+            b.add_to_corpus('There was no willy wonka in the hypodermic chamber')
+            assert ('the', 'hypodermic') in b.model
+            b = Imposter(CORPUS, disk=True)     # reopens the store without rebuilding
+            assert ('the', 'hypodermic') in b.model
+        finally:
+            with open(self.b.corpus_file, 'r') as f:
+                rewrites = [line for line in f if 'hypodermic' not in line]
+            with open(self.b.corpus_file, 'w') as f:
+                f.writelines(rewrites)
+            os.remove(b.store_file)
+
+    def test_failed_disk_build_raises_its_error(self):
+        b = Imposter(CORPUS, disk=True)
+        try:
+            b.model.close()
+            b.model, b.corpus_file = None, os.path.join(b.bot_dir, 'missing.txt')
+            try:
+                b._build_cache_from_corpus()
+                assert False
+            except FileNotFoundError:
+                pass
+        finally:
+            os.remove(b.store_file)
+
+    def test_disk_draft_from_another_thread(self):
+        b = Imposter(CORPUS, disk=True)
+        try:
+            texts, errors = [], []
+
+            def draft():
+                try:
+                    texts.append(b.draft(size=5, min_size=0))
+                except Exception as e:
+                    errors.append(e)
+            worker = threading.Thread(target=draft)
+            worker.start()
+            worker.join()
+            assert not errors and texts[0]
+        finally:
+            b.model.close()
+            os.remove(b.store_file)
+
+    def test_publish_shared_model(self):
+        compact = Imposter(CORPUS, compact=True)
+        try:
+            with compact.publish() as published:
+                files = sorted(os.listdir(compact.bot_dir))
+                os.remove(compact.fingerprint_file)     # would make an owner link the corpus
+                worker = Imposter(CORPUS, shared=published.name)
+                worker.write_result('a worker result.')
+                worker.flush_results()
+                assert 'a worker result.' in worker.history
+                assert sorted(os.listdir(compact.bot_dir)) == [name for name in files
+                                                               if name != 'source.json']
+                assert not Imposter(CORPUS, shared=published.name,
+                                    name='shared_worker').history
+                assert not os.path.isdir(os.path.join(BOTS_DIR, 'shared_worker'))
+                assert worker.model.to_cache().keys() == compact.model.to_cache().keys()
+                random.seed(1)
+                assert worker.generate_text(size=5, min_size=0)
+                for change in (lambda: worker.add_to_corpus('read only.'), worker._save_cache):
+                    try:
+                        change()
+                        assert False
+                    except ValueError:
+                        pass    # the files belong to the publishing bot
+            try:
+                self.b.publish()
+                assert False
+            except ValueError:
+                pass    # cache bots have no model file
+        finally:
+            os.remove(compact.model_file)
+
+    def test_post_queue(self):
+        self.b._rebuild_cache()
+        self.b.unique = True
+        with PostQueue(self.b, size=4, low_water=2) as posts:
+            texts = [posts.get(timeout=5) for _ in range(3)]
+        assert len(set(texts)) == 3
+        assert all(text in self.b.history for text in texts)
+
+    def test_post_queue_disk(self):
+        b = Imposter(CORPUS, disk=True)
+        try:
+            with PostQueue(b, size=4, low_water=2) as posts:
+                texts = [posts.get(timeout=5) for _ in range(3)]
+            assert all(texts)
+        finally:
+            b.model.close()
+            os.remove(b.store_file)
+
+    def test_generate_text_with_keyword(self):
+        self.b._rebuild_cache()
+        for keyword in ('hello', 'file'):
+            text = self.b.generate_text(min_size=0, keyword=keyword)
+            assert keyword in text.lower()
+            assert text[-1] in '.?!'
+        try:
+            self.b.generate_text(keyword='zzz')
+            assert False
+        except ValueError:
+            pass
+
     def test_add_to_corpus_from_file(self):
         with open(NEW_CORP, 'r') as f:
             content = f.read()
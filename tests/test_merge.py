@@ -0,0 +1,94 @@
+import os
+import tempfile
+from collections import Counter
+
+from imposter import merge
+from imposter.config import *
+from imposter.markov import Imposter
+from imposter.merge import merge_bots, merge_models
+from imposter.model import TransitionTable
+from imposter.modelfile import load_model, save_model
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestMerge:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            words = f.read().split()
+        half = len(words) // 2
+        self.parts = [Counter(zip(w, w[1:], w[2:])) for w in (words[:half + 2], words[half:])]
+        self.parts[1][('only', 'in', 'second.')] += 3
+        self.dir = tempfile.mkdtemp()
+        self.paths = []
+        for n, counts in enumerate(self.parts):
+            path = os.path.join(self.dir, '{}.bin'.format(n))
+            save_model(TransitionTable.from_counts(counts), path)
+            self.paths.append(path)
+        self.out = os.path.join(self.dir, 'merged.bin')
+
+    def teardown_method(self, method):
+        for name in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def expected(self, counts):
+        return dict(TransitionTable.from_counts(counts).items())
+
+    def test_merge_sums_counts(self):
+        merge_models(self.paths, self.out)
+        merged = load_model(self.out)
+        items = self.expected(self.parts[0] + self.parts[1])
+        assert dict(merged.items()) == items
+        save_model(TransitionTable.from_counts(self.parts[0] + self.parts[1]),
+                   os.path.join(self.dir, 'rebuilt.bin'))
+        with open(self.out, 'rb') as f, open(os.path.join(self.dir, 'rebuilt.bin'), 'rb') as g:
+            assert f.read() == g.read()
+
+    def test_weights_scale_and_drop_counts(self):
+        merge_models(self.paths, self.out, weights=[2, 0.1])
+        merged = load_model(self.out)
+        weighted = Counter({w: 2 * c for w, c in self.parts[0].items()})
+        for w, c in self.parts[1].items():
+            weighted[w] += 0.1 * c
+        weighted = Counter({w: int(round(c)) for w, c in weighted.items() if round(c) > 0})
+        items = self.expected(weighted)
+        assert dict(merged.items()) == items
+        assert ('only', 'in') not in merged
+
+    def test_merge_with_itself(self):
+        merge_models([self.paths[0], self.paths[0]], self.out)
+        items = self.expected(self.parts[0] + self.parts[0])
+        assert dict(load_model(self.out).items()) == items
+
+    def test_merge_bot_with_logged_changes(self):
+        bot = Imposter(CORPUS, compact=True)
+        try:
+            bot.add_to_corpus('zebra quagga okapi.')
+            bot.select_seed()      # folds the changes into rows, they are still only logged
+            merge_bots([bot], self.out)
+            assert load_model(self.out).successors(('zebra', 'quagga')) == {'okapi.': 1}
+        finally:
+            with open(bot.corpus_file) as f:
+                rewrites = [line for line in f if 'zebra' not in line]
+            with open(bot.corpus_file, 'w') as f:
+                f.writelines(rewrites)
+            for path in (bot.model_file, bot.delta_file):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def test_merge_disk_bot(self):
+        bot = Imposter(CORPUS, disk=True)
+        flush_items = merge.FLUSH_ITEMS
+        merge.FLUSH_ITEMS = 8   # windows and sentence starts sorted in many runs
+        try:
+            merge_bots([bot], self.out)
+            rebuilt = os.path.join(self.dir, 'rebuilt.bin')
+            save_model(TransitionTable.from_cache(bot.model.to_cache()), rebuilt)
+            with open(self.out, 'rb') as f, open(rebuilt, 'rb') as g:
+                assert f.read() == g.read()
+        finally:
+            merge.FLUSH_ITEMS = flush_items
+            bot.model.close()
+            os.remove(bot.store_file)
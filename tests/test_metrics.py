@@ -0,0 +1,37 @@
+import time
+
+from imposter.metrics import BATCH, Metrics
+
+
+class TestMetrics:
+
+    def setup_method(self, method):
+        self.events = []
+        self.metrics = Metrics([lambda *event: self.events.append(event)])
+
+    def test_timer_records_calls_and_calls_hooks(self):
+        for _ in range(3):
+            with self.metrics.timer('work'):
+                time.sleep(0.001)
+        summary = self.metrics.summary()['timers']['work']
+        assert summary['calls'] == 3
+        assert summary['max_s'] >= 0.001
+        assert abs(summary['mean_s'] * 3 - summary['total_s']) < 1e-9
+        assert [kind for kind, name, _ in self.events] == ['timer'] * 3
+
+    def test_timer_excludes_nested_timer(self):
+        with self.metrics.timer('build', exclude='save'):
+            with self.metrics.timer('save'):
+                time.sleep(0.05)
+        assert self.metrics.total('build') < 0.05 <= self.metrics.total('save')
+
+    def test_timed_iter_yields_everything_and_records_once(self):
+        items = list(self.metrics.timed_iter('read', range(BATCH * 2 + 5)))
+        assert items == list(range(BATCH * 2 + 5))
+        assert self.metrics.timers['read'][0] == 1
+
+    def test_counters(self):
+        self.metrics.count('posts')
+        self.metrics.count('posts', 4)
+        assert self.metrics.summary()['counters'] == {'posts': 5}
+        assert self.events == [('counter', 'posts', 1), ('counter', 'posts', 4)]
@@ -0,0 +1,110 @@
+import random
+from collections import Counter
+
+from imposter.config import *
+from imposter.model import TransitionTable, Vocabulary, pack, unpack
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestTransitionTable:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            self.words = f.read().split()
+        self.windows = list(zip(self.words, self.words[1:], self.words[2:]))
+        self.cache = {}
+        for state in self.windows:
+            self.cache.setdefault(state[:2], []).append(state[2])
+        self.table = TransitionTable.from_windows(self.windows)
+
+    def test_pack_roundtrip(self):
+        ids = (5, 0, 1023)
+        assert unpack(pack(ids, 10), 10, 3) == ids
+
+    def test_vocabulary_interns_once(self):
+        vocab = Vocabulary(['a', 'b', 'a'])
+        assert len(vocab) == 2
+        assert vocab.intern('b') == 1
+        assert vocab[vocab.get('a')] == 'a'
+
+    def test_counts_match_cache(self):
+        assert len(self.table) == len(self.cache)
+        for state, followers in self.cache.items():
+            assert self.table.successors(state) == Counter(followers)
+
+    def test_keys_sorted(self):
+        keys = list(self.table.keys)
+        assert keys == sorted(keys)
+
+    def test_cache_roundtrip(self):
+        table = TransitionTable.from_cache(self.cache)
+        expanded = table.to_cache()
+        assert expanded.keys() == self.cache.keys()
+        for state, followers in self.cache.items():
+            assert sorted(expanded[state]) == sorted(followers)
+
+    def test_transition_count_with_update(self):
+        state = self.windows[0][:2]
+        followers = set(self.cache[state])
+        self.table.update(Counter({state + (self.words[5],): 1, ('new', 'state', 'here'): 1}))
+        expected = len(set(self.windows)) + 1 + (self.words[5] not in followers)
+        assert self.table.transition_count == expected
+        self.table.freeze()
+        assert self.table.transition_count == expected
+
+    def test_missing_state(self):
+        assert self.table.find(('not', 'there')) == -1
+        try:
+            self.table.choose(('not', 'there'))
+            assert False
+        except KeyError:
+            pass
+
+    def test_choose_distribution(self):
+        state = ('will', 'be')
+        followers = Counter(self.cache[state])
+        random.seed(1)
+        picks = Counter(self.table.choose(state) for _ in range(2000))
+        assert set(picks) == set(followers)
+        total = sum(followers.values())
+        for word, count in followers.items():
+            assert abs(picks[word] / 2000 - count / total) < 0.05
+
+    def test_choose_many_distribution(self):
+        state = ('will', 'be')
+        followers = Counter(self.cache[state])
+        random.seed(2)
+        picks = Counter(self.table.choose_many(state, 2000))
+        assert sum(picks.values()) == 2000
+        total = sum(followers.values())
+        for word, count in followers.items():
+            assert abs(picks[word] / 2000 - count / total) < 0.05
+
+    def test_sampler_stays_in_row(self):
+        sampler = self.table.sampler
+        for row in range(len(self.table)):
+            lo, hi, base, total = sampler.bounds(row)
+            assert total == sum(self.table.counts[lo:hi])
+            assert sampler.sample(row) in self.table.next_ids[lo:hi]
+
+
+class TestVectorizedBuild:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            self.words = f.read().split()
+
+    def test_matches_python_build(self):
+        from imposter.npbuild import build_table
+        for order in (1, 2, 3):
+            windows = zip(*(self.words[i:] for i in range(order + 1)))
+            expected = TransitionTable.from_windows(windows, order)
+            table = build_table(self.words, order)
+            assert list(table.keys) == list(expected.keys)
+            assert dict(table.items()) == dict(expected.items())
+            assert list(table.sampler.cumulative) == list(expected.sampler.cumulative)
+
+    def test_too_few_words(self):
+        from imposter.npbuild import build_table
+        assert len(build_table(self.words[:2], 2)) == 0
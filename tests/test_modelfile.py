@@ -0,0 +1,64 @@
+import tempfile
+
+from imposter.config import *
+from imposter.model import TransitionTable, Vocabulary
+from imposter.modelfile import load_model, save_model
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestModelFile:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            words = f.read().split()
+        self.table = TransitionTable.from_windows(zip(words, words[1:], words[2:]))
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'model.bin')
+        save_model(self.table, self.path)
+        self.loaded = load_model(self.path)
+
+    def teardown_method(self, method):
+        self.loaded = None
+        self.dir.cleanup()
+
+    def test_roundtrip(self):
+        assert len(self.loaded) == len(self.table)
+        assert self.loaded.transition_count == self.table.transition_count
+        for state, followers in self.table.items():
+            assert self.loaded.successors(state) == followers
+
+    def test_vocabulary_sorted_and_searchable(self):
+        vocab = self.loaded.vocab
+        words = [vocab[i] for i in range(len(vocab))]
+        assert words == sorted(words)
+        for i, word in enumerate(words):
+            assert vocab.get(word) == i
+        assert vocab.get('hypodermic') is None
+
+    def test_intern_after_load(self):
+        vocab = self.loaded.vocab
+        new_id = vocab.intern('hypodermic')
+        assert new_id == len(vocab) - 1
+        assert vocab[new_id] == 'hypodermic'
+        assert vocab.intern('hypodermic') == new_id
+
+    def test_resave_loaded_model(self):
+        path = os.path.join(self.dir.name, 'copy.bin')
+        save_model(self.loaded, path)
+        with open(self.path, 'rb') as a, open(path, 'rb') as b:
+            assert a.read() == b.read()
+
+    def test_choose_from_mapped_model(self):
+        state = ('will', 'be')
+        assert self.loaded.choose(state) in self.table.successors(state)
+        assert len(self.loaded.choose_many(state, 10)) == 10
+
+    def test_rebased_table_saves_only_its_words(self):
+        table = self.table.rebase(Vocabulary(['unused', 'words']))
+        assert dict(table.items()) == dict(self.table.items())
+        path = os.path.join(self.dir.name, 'rebased.bin')
+        save_model(table, path)
+        loaded = load_model(path)
+        assert len(loaded.vocab) == len(self.table.vocab)
+        assert dict(loaded.items()) == dict(self.table.items())
@@ -0,0 +1,62 @@
+import random
+
+from imposter.config import *
+from imposter.overlap import CopyIndex, shingle_hashes
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+def brute_force(corpus, words):
+    best = 0
+    for i in range(len(words)):
+        for p in range(len(corpus)):
+            length = 0
+            while (i + length < len(words) and p + length < len(corpus)
+                   and corpus[p + length] == words[i + length]):
+                length += 1
+            best = max(best, length)
+    return best
+
+
+class TestCopyIndex:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            self.words = f.read().split()
+        self.index = CopyIndex(self.words, shingle=2)
+
+    def test_finds_copied_run(self):
+        text = ['unknown', 'words'] + self.words[10:25] + ['more']
+        length, position = self.index.longest_overlap(' '.join(text))
+        assert length == 15
+        assert self.words[position:position + 15] == self.words[10:25]
+
+    def test_matches_brute_force(self):
+        random.seed(5)
+        for _ in range(30):
+            text = []
+            for _ in range(4):
+                start = random.randrange(len(self.words))
+                text += self.words[start:start + random.randint(1, 8)]
+            expected = brute_force(self.words, text)
+            assert self.index.longest_overlap(text)[0] == (expected if expected >= 2 else 0)
+
+    def test_common_shingle(self):
+        corpus = ['so', 'it', 'goes.'] * 100 + ['so', 'it', 'was', 'a', 'copy.']
+        length, position = CopyIndex(corpus, shingle=2).longest_overlap('so it was a copy.')
+        assert (length, position) == (5, 300)
+
+    def test_no_overlap(self):
+        assert self.index.longest_overlap('zzz qqq xxx yyy') == (0, -1)
+        assert self.index.longest_overlap('') == (0, -1)
+
+    def test_common_shingles_bisected(self):
+        random.seed(7)
+        corpus = [random.choice(('so', 'it', 'goes.', 'was')) for _ in range(3000)]
+        index = CopyIndex(corpus, shingle=2)
+        ids = [index.vocab.get(word) for word in ('so', 'it', 'was', 'so')]
+        assert len(index._candidates(shingle_hashes(ids, 2)[0], ids, 0)) <= 2
+        for _ in range(30):
+            start = random.randrange(len(corpus))
+            text = corpus[start:start + random.randint(2, 20)] + ['so', 'it', 'was', 'it']
+            assert index.longest_overlap(text)[0] == brute_force(corpus, text)
@@ -0,0 +1,48 @@
+from collections import Counter
+
+from imposter import parallel
+from imposter.config import *
+from imposter.model import TransitionTable, unpack
+from imposter.parallel import count_shard, count_table, shard_ranges, shard_vocabulary
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestParallelBuild:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            self.words = f.read().split()
+
+    def expected(self, size):
+        return Counter(zip(*(self.words[i:] for i in range(size))))
+
+    def test_shards_split_on_whitespace(self):
+        with open(CORPUS, 'rb') as f:
+            data = f.read()
+        ranges = shard_ranges(CORPUS, 13)
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+        words = []
+        for start, end in ranges:
+            assert end == len(data) or data[end:end + 1].isspace()
+            words.extend(data[start:end].decode('utf-8').split())
+        assert words == self.words
+
+    def test_shard_counts_merge_to_serial_counts(self):
+        words = sorted(set.union(*(shard_vocabulary((CORPUS, start, end, 3))
+                                   for start, end in shard_ranges(CORPUS, 17))))
+        assert words == sorted(set(self.words))
+        parallel._use_vocabulary(words)
+        bits = (len(words) - 1).bit_length()
+        for size in (2, 3, 5):
+            counts = Counter()
+            for start, end in shard_ranges(CORPUS, 17):
+                windows, shard_counts = count_shard((CORPUS, start, end, size))
+                assert list(windows) == sorted(windows)
+                for window, count in zip(windows, shard_counts):
+                    counts[tuple(words[i] for i in unpack(window, bits, size))] += count
+            assert counts == self.expected(size)
+
+    def test_count_table_in_pool(self):
+        table = count_table(CORPUS, 2, processes=2)
+        assert dict(table.items()) == dict(TransitionTable.from_counts(self.expected(3)).items())
@@ -0,0 +1,67 @@
+import threading
+
+from imposter.metrics import Metrics
+from imposter.pregen import PostQueue
+
+
+class CountingBot:
+    """Drafts 'post 0', 'post 1', ... and fails after limit drafts"""
+
+    name = 'counting'
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.drafted = 0
+        self.posted = []
+        self.metrics = Metrics()
+        self.proceed = threading.Event()
+        self.proceed.set()
+
+    def draft(self, exclude=(), **options):
+        self.proceed.wait()
+        if self.drafted == self.limit:
+            raise ValueError('no new text')
+        self.drafted += 1
+        return 'post {}'.format(self.drafted - 1)
+
+    def write_result(self, text):
+        self.posted.append(text)
+
+
+class TestPostQueue:
+
+    def test_fills_to_size_and_refills_at_low_water(self):
+        bot = CountingBot()
+        with PostQueue(bot, size=6, low_water=3) as posts:
+            with posts.changed:
+                posts.changed.wait_for(lambda: len(posts) == 6)
+            for i in range(3):
+                assert posts.get() == 'post {}'.format(i)
+            assert bot.drafted == 6     # no refill down to low water
+            assert posts.get() == 'post 3'
+            with posts.changed:
+                posts.changed.wait_for(lambda: len(posts) == 6)
+            assert bot.drafted == 10
+        assert bot.posted == ['post {}'.format(i) for i in range(4)]
+        assert bot.metrics.counters['posts'] == 4
+
+    def test_error_raised_after_ready_posts(self):
+        with PostQueue(CountingBot(limit=2), size=4, low_water=2) as posts:
+            assert [posts.get(), posts.get()] == ['post 0', 'post 1']
+            try:
+                posts.get(timeout=5)
+                assert False
+            except ValueError:
+                pass
+
+    def test_timeout(self):
+        bot = CountingBot()
+        bot.proceed.clear()
+        posts = PostQueue(bot)
+        try:
+            posts.get(timeout=0.01)
+            assert False
+        except TimeoutError:
+            pass
+        bot.proceed.set()
+        posts.close()
@@ -0,0 +1,43 @@
+from collections import Counter
+
+from imposter.config import *
+from imposter.model import TransitionTable
+from imposter.prune import prune_table
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestPrune:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            words = f.read().split()
+        self.windows = list(zip(words, words[1:], words[2:]))
+        self.table = TransitionTable.from_windows(self.windows)
+
+    def test_min_count_and_top_k(self):
+        counts = Counter({('a', 'b', 'c'): 5, ('a', 'b', 'd'): 1, ('a', 'b', 'e'): 3,
+                          ('b', 'c', 'x'): 2, ('b', 'c', 'y'): 2})
+        table = TransitionTable.from_counts(counts)
+        pruned = prune_table(table, min_count=2, top_k=1, drop_dead_ends=False)
+        assert dict(pruned.items()) == {('a', 'b'): {'c': 5}, ('b', 'c'): {'x': 2}}
+
+    def test_dead_ends_removed_transitively(self):
+        # (c, d) is never left, so (b, c) -> d and then (a, b) -> c lead nowhere
+        counts = Counter({('a', 'b', 'c'): 1, ('b', 'c', 'd'): 1, ('c', 'd', 'e'): 1,
+                          ('x', 'y', 'x'): 1, ('y', 'x', 'y'): 1, ('x', 'y', 'c'): 1})
+        table = TransitionTable.from_counts(counts)
+        pruned = prune_table(table)
+        assert dict(pruned.items()) == {('x', 'y'): {'x': 1}, ('y', 'x'): {'y': 1}}
+
+    def test_every_kept_transition_can_continue(self):
+        pruned = prune_table(self.table)
+        assert 0 < len(pruned) < len(self.table)
+        for state, followers in pruned.items():
+            for word in followers:
+                assert state[1:] + (word,) in pruned
+                assert followers[word] == self.table.successors(state)[word]
+
+    def test_no_options_keeps_table(self):
+        pruned = prune_table(self.table, drop_dead_ends=False)
+        assert dict(pruned.items()) == dict(self.table.items())
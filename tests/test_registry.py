@@ -0,0 +1,57 @@
+import shutil
+
+from imposter.config import *
+from imposter.registry import ModelRegistry
+
+NEW_CORP = os.path.join(CORPUS_FILES_DIR, 'tst_new_body.txt')
+BOT_DIR = os.path.join(BOTS_DIR, 'registry_test')
+CREATED = ['model.bin', 'source.json']
+
+
+class TestModelRegistry:
+
+    def setup_method(self, method):
+        os.makedirs(BOT_DIR, exist_ok=True)
+        shutil.copyfile(NEW_CORP, os.path.join(BOT_DIR, 'corpus.txt'))
+        self.registry = ModelRegistry()
+
+    def teardown_method(self, method):
+        shutil.rmtree(BOT_DIR)
+        for name in CREATED:
+            path = os.path.join(BOTS_DIR, 'testing', name)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def test_names(self):
+        assert {'testing', 'registry_test'} <= set(self.registry.names())
+
+    def test_loads_once_mapped(self):
+        for name in ('registry_test', 'testing'):
+            if os.path.isfile(os.path.join(BOTS_DIR, name, 'model.bin')):
+                os.remove(os.path.join(BOTS_DIR, name, 'model.bin'))
+        bot = self.registry.get('registry_test')
+        assert self.registry.get('registry_test') is bot
+        assert isinstance(bot.model.keys, memoryview)   # built, saved and mapped, not copied
+        assert bot.generate_text(size=10, min_size=2)
+        self.registry.bots.clear()
+        self.registry.sizes.clear()
+        bot = self.registry.get('registry_test')
+        assert isinstance(bot.model.keys, memoryview)
+        assert self.registry.nbytes >= os.path.getsize(bot.model_file)
+
+    def test_unknown_bot(self):
+        try:
+            self.registry.get('no_such_bot')
+            assert False
+        except KeyError:
+            pass
+
+    def test_evicts_least_recently_used(self):
+        self.registry.get('testing')
+        self.registry.get('registry_test')
+        self.registry.get('testing')
+        self.registry.memory_budget = self.registry.nbytes - 1
+        self.registry.evict()
+        assert 'testing' in self.registry
+        assert 'registry_test' not in self.registry
+        assert self.registry.get('registry_test').model is not None
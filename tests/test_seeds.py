@@ -0,0 +1,86 @@
+import random
+import tempfile
+from collections import Counter
+
+from imposter.config import *
+from imposter.model import TransitionTable
+from imposter.modelfile import load_model, save_model
+from imposter.seeds import AliasTable, ModelSeeds, cache_seed_index
+
+CORPUS = os.path.join(CORPUS_FILES_DIR, 'testing.txt')
+
+
+class TestSeeds:
+
+    def setup_method(self, method):
+        with open(CORPUS) as f:
+            words = f.read().split()
+        self.windows = list(zip(words, words[1:], words[2:]))
+        self.cache = {}
+        for state in self.windows:
+            self.cache.setdefault(state[:2], []).append(state[2])
+        self.table = TransitionTable.from_windows(self.windows)
+
+    def expected_starts(self):
+        starts = Counter(w[1:] for w in self.windows if w[0][-1] in '.?!')
+        return {s: c for s, c in starts.items() if s in self.cache}
+
+    def test_alias_distribution(self):
+        random.seed(4)
+        weights = [1, 0, 5, 14]
+        table = AliasTable(weights)
+        picks = Counter(table.sample() for _ in range(20000))
+        assert picks[1] == 0
+        for i, w in enumerate(weights):
+            assert abs(picks[i] / 20000 - w / 20) < 0.02
+
+    def test_empty(self):
+        for build in (lambda: AliasTable([]), lambda: cache_seed_index({})):
+            try:
+                build()
+                assert False
+            except ValueError:
+                pass
+        assert len(cache_seed_index({('no', 'end'): ['here']}, sentence_start=True)) == 1
+
+    def test_cache_sentence_starts(self):
+        index = cache_seed_index(self.cache, sentence_start=True)
+        assert set(index.states) == set(self.expected_starts())
+
+    def starts(self, table, rows, totals):
+        return {table.row_state(r): t - (totals[i - 1] if i else 0)
+                for i, (r, t) in enumerate(zip(rows, totals))}
+
+    def test_table_sentence_starts(self):
+        assert self.starts(self.table, *self.table.sentence_starts()) == self.expected_starts()
+
+    def test_starts_saved_with_model(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'model.bin')
+            save_model(self.table, path)
+            loaded = load_model(path)
+            assert self.starts(loaded, *loaded.starts) == self.expected_starts()
+
+    def draws(self, seeds, n=40000):
+        random.seed(6)
+        picks = Counter(seeds.sample() for _ in range(n))
+        return {state: count / n for state, count in picks.items()}
+
+    def assert_close(self, draws, weights):
+        total = sum(weights.values())
+        assert set(draws) <= set(weights)
+        for state, weight in weights.items():
+            assert abs(draws.get(state, 0) - weight / total) < 0.01
+
+    def test_model_seeds_follow_updates(self):
+        added = 'Dogs bark. Dogs bark loudly. Cats bark. Then the cat sat.'.split()
+        new = list(zip(added, added[1:], added[2:]))
+        self.table.update(Counter(new))
+        self.table.update({self.windows[0]: -1})
+        self.windows = self.windows[1:] + new
+        self.cache = {}
+        for state in self.windows:
+            self.cache.setdefault(state[:2], []).append(state[2])
+        self.assert_close(self.draws(ModelSeeds(self.table)), Counter(w[:2] for w in self.windows))
+        self.assert_close(self.draws(ModelSeeds(self.table, sentence_start=True)),
+                          self.expected_starts())
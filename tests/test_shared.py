@@ -0,0 +1,43 @@
+import os
+import tempfile
+from multiprocessing import Pool
+
+from imposter.model import TransitionTable
+from imposter.modelfile import save_model
+from imposter.shared import attach_model, publish_model
+
+WORDS = 'the cat sat. the cat ran. a dog sat on the cat. the dog ran off.'.split()
+
+
+def successors(name, state):
+    return attach_model(name).successors(state)
+
+
+class TestSharedModel:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'model.bin')
+        self.table = TransitionTable.from_windows(zip(WORDS, WORDS[1:], WORDS[2:]))
+        save_model(self.table, self.path)
+        self.published = publish_model(self.path)
+
+    def teardown_method(self, method):
+        self.published.close()
+        os.remove(self.path)
+        os.rmdir(self.dir)
+
+    def test_attach(self):
+        model = attach_model(self.published.name)
+        assert dict(model.items()) == dict(self.table.items())
+        try:
+            model.buffer[0] = 0
+            assert False
+        except TypeError:
+            pass    # read-only
+
+    def test_attach_from_workers(self):
+        with Pool(2) as pool:
+            results = pool.starmap(successors, [(self.published.name, ('the', 'cat'))] * 4)
+        assert results == [{'sat.': 1, 'ran.': 1}] * 4
+        assert attach_model(self.published.name).successors(('the', 'cat')) == {'sat.': 1, 'ran.': 1}
@@ -0,0 +1,64 @@
+import os
+import random
+import tempfile
+from collections import Counter
+
+from imposter.model import TransitionTable
+from imposter.store import SQLiteStore
+
+WORDS = 'the cat sat. the cat ran. a dog sat on the cat. the dog ran off.'.split()
+
+
+def windows(words, order=2):
+    return zip(*(words[i:] for i in range(order + 1)))
+
+
+class TestSQLiteStore:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'model.sqlite')
+        self.store = SQLiteStore.from_windows(self.path, windows(WORDS), hot_states=2)
+        self.table = TransitionTable.from_windows(windows(WORDS))
+
+    def teardown_method(self, method):
+        self.store.close()
+        for name in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def test_matches_transition_table(self):
+        assert len(self.store) == len(self.table)
+        assert self.store.transition_count == self.table.transition_count
+        assert self.store.to_cache().keys() == self.table.to_cache().keys()
+        for state, followers in self.store.items():
+            assert followers == self.table.successors(state)
+
+    def test_choose_follows_counts(self):
+        random.seed(0)
+        picks = Counter(self.store.choose(('the', 'cat')) for _ in range(2000))
+        assert picks.keys() == {'sat.', 'ran.'}
+        assert abs(picks['sat.'] - picks['ran.']) < 200
+        assert len(self.store.hot) <= 2
+        try:
+            self.store.choose(('no', 'such'))
+            assert False
+        except KeyError:
+            pass
+
+    def test_update_and_reopen(self):
+        self.store.successors(('the', 'cat'))   # cached, must be invalidated
+        self.store.update({('the', 'cat', 'sat.'): -1, ('the', 'cat', 'hid.'): 2})
+        self.store.commit()
+        assert self.store.successors(('the', 'cat')) == {'ran.': 1, 'hid.': 2}
+        self.store.close()
+        self.store = SQLiteStore(self.path, order=3)
+        assert self.store.order == 2
+        assert self.store.successors(('the', 'cat')) == {'ran.': 1, 'hid.': 2}
+
+    def test_sample_state(self):
+        self.store.index_seeds()
+        states = {self.store.sample_state() for _ in range(200)}
+        assert states == set(self.table.to_cache().keys())
+        starts = {self.store.sample_state(sentence_start=True) for _ in range(200)}
+        assert starts == {('the', 'cat'), ('a', 'dog'), ('the', 'dog')}
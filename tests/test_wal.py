@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+from imposter.wal import TransitionLog
+
+
+class TestTransitionLog:
+
+    def setup_method(self, method):
+        self.dir = tempfile.mkdtemp()
+        self.snapshot = os.path.join(self.dir, 'cache.json')
+        with open(self.snapshot, 'w') as f:
+            f.write('{}')
+        self.log = TransitionLog(os.path.join(self.dir, 'cache.wal'), sync=False)
+        self.changes = [{('a', 'b', 'c'): 2}, {('a', 'b', 'c'): -1, ('b', 'c', 'd.'): 1}]
+
+    def teardown_method(self, method):
+        for name in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def test_replay(self):
+        for delta in self.changes:
+            self.log.append(delta, self.snapshot)
+        assert list(self.log.replay(self.snapshot)) == self.changes
+        assert list(self.log.replay(self.snapshot)) == self.changes
+
+    def test_torn_record_truncated(self):
+        for delta in self.changes:
+            self.log.append(delta, self.snapshot)
+        size = self.log.size
+        with open(self.log.path, 'r+b') as f:
+            f.truncate(size - 3)
+        assert list(self.log.replay(self.snapshot)) == self.changes[:1]
+        self.log.append(self.changes[1], self.snapshot)
+        assert list(self.log.replay(self.snapshot)) == self.changes
+
+    def test_corrupt_record_ignored(self):
+        for delta in self.changes:
+            self.log.append(delta, self.snapshot)
+        with open(self.log.path, 'r+b') as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b'xx')
+        assert list(self.log.replay(self.snapshot)) == self.changes[:1]
+
+    def test_log_of_older_snapshot_dropped(self):
+        self.log.append(self.changes[0], self.snapshot)
+        with open(self.snapshot, 'w') as f:
+            f.write('{"new": 1}')   # saved again, changes are folded in
+        assert list(self.log.replay(self.snapshot)) == []
+        assert not os.path.isfile(self.log.path)